@@ -0,0 +1,83 @@
+# bench/bench_als.py
+"""
+基准测试：ALS 离线训练的两个引擎
+- spark：spark_runner.train_spark (启动 JVM + pandas -> Spark -> pandas)
+- numpy：services/als_engine (进程内共轭梯度 ALS)
+使用同一份合成评分和同一份 80/20 划分 (is_train 列)，输出训练 + 评估的总耗时和测试集 RMSE。
+不依赖数据库；没有安装 pyspark 时只跑 numpy 引擎。
+
+运行: python bench/bench_als.py
+"""
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spark_runner
+from services import als_engine
+
+# --- 配置区域 ---
+NUM_USERS = 20000
+NUM_ITEMS = 10000
+RATINGS_PER_USER = 50
+TRUE_RANK = 6  # 合成数据的真实隐因子维度
+NOISE = 1.0  # 评分噪声 (标准差)
+
+
+def synthetic_ratings(rng):
+    """热门长尾分布的 (user_id, tconst, rating)，评分由隐因子生成并截断到 1~10"""
+    popularity = 1.0 / np.arange(1, NUM_ITEMS + 1) ** 0.8
+    popularity /= popularity.sum()
+    user_ids = np.repeat(np.arange(1, NUM_USERS + 1), RATINGS_PER_USER)
+    items = rng.choice(NUM_ITEMS, size=len(user_ids), p=popularity)
+
+    # 每个用户对同一部电影只评一次 (与 uix_user_rating 一致)
+    _, first = np.unique(user_ids * NUM_ITEMS + items, return_index=True)
+    user_ids, items = user_ids[first], items[first]
+
+    user_taste = rng.random((NUM_USERS + 1, TRUE_RANK))
+    item_traits = rng.random((NUM_ITEMS, TRUE_RANK))
+    ratings = (user_taste[user_ids] * item_traits[items]).sum(axis=1) * (10 / TRUE_RANK) * 2
+    ratings = np.clip(ratings + rng.normal(0, NOISE, len(ratings)), 1, 10).round(1)
+
+    return pd.DataFrame({
+        "user_id": user_ids,
+        "tconst": np.array([f"tt{i:07d}" for i in range(NUM_ITEMS)])[items],
+        "rating": ratings,
+        "strength": ratings / 10,
+    })
+
+
+def main():
+    rng = np.random.default_rng(42)
+    pdf_ratings = synthetic_ratings(rng)
+    pdf_ratings["is_train"] = als_engine.split(len(pdf_ratings), ratio=0.8, seed=42)
+    training, test = pdf_ratings[pdf_ratings.is_train], pdf_ratings[~pdf_ratings.is_train]
+    print(f"🧪 合成数据: {pdf_ratings.user_id.nunique()} 用户, {pdf_ratings.tconst.nunique()} 部电影, "
+          f"{len(pdf_ratings)} 条评分 (训练 {len(training)} / 测试 {len(test)})")
+
+    baseline = float(np.sqrt(np.mean((test.rating - training.rating.mean()) ** 2)))
+    print(f"   - {'全局均值基线':<10} RMSE {baseline:.4f}")
+
+    engines = ["numpy"]
+    if importlib.util.find_spec("pyspark") is not None:
+        engines.insert(0, "spark")
+    else:
+        print("⚠️ 未安装 pyspark，跳过 Spark 引擎")
+
+    for name in engines:
+        start = time.perf_counter()
+        factors, rmse, _ = spark_runner.TRAINERS[name](pdf_ratings)
+        elapsed = time.perf_counter() - start
+        print(f"   - {name:<10} 耗时 {elapsed:8.2f}s | RMSE {rmse:.4f} | "
+              f"{len(factors.user_ids)} 用户因子, {len(factors.item_ids)} 电影因子")
+
+
+if __name__ == "__main__":
+    main()
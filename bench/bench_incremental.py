@@ -0,0 +1,126 @@
+# bench/bench_incremental.py
+"""
+一致性检查 + 基准测试：Item-CF 增量更新 (SimilarityModel.apply_updates) vs 全量训练 (similarity_model.train)
+场景 (与线上 update_model_incremental 一致，传入受影响用户的完整当前互动 + 受影响用户列表)：
+- 普通变化：一批用户新增 / 修改 / 删除了部分互动
+- 删光互动：用户删掉了最后一条评分并取消了全部收藏，三元组里已经没有他，只能靠 affected_users 减掉旧互动
+每个场景比较增量结果与全量重训的相似度矩阵和范数，最大误差超过 TOLERANCE 视为失败 (退出码 1)；
+整行重算的行数超过电影数的 MAX_UPDATED_FRACTION 也视为失败 (增量退化成了全量重算)。
+使用合成数据，不依赖数据库。
+
+运行: python bench/bench_incremental.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import similarity_model
+
+# --- 配置区域 ---
+NUM_USERS = 5000
+NUM_ITEMS = 20000
+INTERACTIONS_PER_USER = 60
+CHANGED_USERS = 20  # 每个场景受影响的用户数 (约等于线上一个调度周期的变化量)
+TOLERANCE = 1e-5
+MAX_UPDATED_FRACTION = 0.1  # 整行重算的行数占电影数的上限
+
+
+def synthetic_interactions(rng):
+    """热门长尾分布的 (user_id, tconst, 分值)"""
+    popularity = 1.0 / np.arange(1, NUM_ITEMS + 1) ** 0.8
+    popularity /= popularity.sum()
+    n = NUM_USERS * INTERACTIONS_PER_USER
+    user_ids = np.repeat(np.arange(NUM_USERS, dtype=np.int64), INTERACTIONS_PER_USER)
+    item_pool = np.array([f"tt{i:07d}" for i in range(NUM_ITEMS)])
+    tconsts = item_pool[rng.choice(NUM_ITEMS, size=n, p=popularity)]
+    values = rng.uniform(3.0, 10.0, size=n).round(1)
+    return user_ids, tconsts, values
+
+
+def partial_changes(rng, user_ids, tconsts, values, affected):
+    """受影响的用户随机删掉一半互动、其余改分，再各自新增几条 (含词表外的新电影)"""
+    mine = np.isin(user_ids, affected)
+    keep = mine & (rng.random(len(user_ids)) < 0.5)
+    new_users = np.repeat(affected, 5)
+    new_tconsts = np.array([f"tt{i:08d}" for i in rng.integers(0, NUM_ITEMS * 2, size=len(new_users))])
+    return (
+        np.concatenate((user_ids[keep], new_users)),
+        np.concatenate((tconsts[keep], new_tconsts)),
+        np.concatenate((rng.uniform(3.0, 10.0, size=int(keep.sum())).round(1),
+                        rng.uniform(3.0, 10.0, size=len(new_users)).round(1))),
+    )
+
+
+def removed_all(rng, user_ids, tconsts, values, affected):
+    """受影响的用户删光了全部互动：当前互动为空"""
+    return user_ids[:0], tconsts[:0], values[:0]
+
+
+SCENARIOS = (
+    ("部分变化", partial_changes),
+    ("删光互动", removed_all),
+)
+
+
+def check(base, user_ids, tconsts, values, affected, scenario, rng):
+    new_u, new_t, new_v = scenario(rng, user_ids, tconsts, values, affected)
+
+    start = time.perf_counter()
+    incremental = base.apply_updates(new_u, new_t, new_v, affected_users=affected)
+    incremental_seconds = time.perf_counter() - start
+
+    others = ~np.isin(user_ids, affected)
+    start = time.perf_counter()
+    full = similarity_model.train(
+        np.concatenate((user_ids[others], new_u)),
+        np.concatenate((tconsts[others], new_t)),
+        np.concatenate((values[others], new_v)),
+    )
+    full_seconds = time.perf_counter() - start
+
+    # 全量训练的词表只含仍有互动的电影，按 tconst 对齐后再比较
+    idx = incremental.index_of(full.item_ids)
+    similarity = incremental.similarity[idx][:, idx]
+    orphans = np.setdiff1d(np.arange(incremental.item_count), idx)
+    sim_error = float(abs(similarity - full.similarity).max())
+    norm_error = float(np.abs(incremental.sq_norms[idx] - full.sq_norms).max()) if len(idx) else 0.0
+    stale = int(incremental.similarity[orphans].nnz + incremental.similarity[:, orphans].nnz)
+    return incremental, incremental_seconds, full_seconds, sim_error, norm_error, stale
+
+
+def main():
+    rng = np.random.default_rng(42)
+    user_ids, tconsts, values = synthetic_interactions(rng)
+    print(f"🧪 合成数据: {NUM_USERS} 用户 × {INTERACTIONS_PER_USER} 互动, {NUM_ITEMS} 部电影")
+
+    start = time.perf_counter()
+    base = similarity_model.train(user_ids, tconsts, values)
+    print(f"✅ 基线训练完成: {base.item_count} 部电影, 耗时 {time.perf_counter() - start:.2f}s")
+
+    failed = False
+    for name, scenario in SCENARIOS:
+        affected = np.sort(rng.choice(NUM_USERS, size=CHANGED_USERS, replace=False)).astype(np.int64)
+        model, inc_s, full_s, sim_error, norm_error, stale = check(
+            base, user_ids, tconsts, values, affected, scenario, rng
+        )
+        updated_fraction = model.meta["updated_rows"] / model.item_count
+        ok = (sim_error <= TOLERANCE and norm_error <= TOLERANCE and stale == 0
+              and updated_fraction <= MAX_UPDATED_FRACTION)
+        failed = failed or not ok
+        print(f"   {'✅' if ok else '❌'} {name:<6} 增量 {inc_s:6.2f}s (重算 {model.meta['updated_rows']} 行 / "
+              f"修补 {model.meta['patched_rows']} 行) | "
+              f"全量 {full_s:6.2f}s | 相似度最大误差 {sim_error:.2e} | 范数最大误差 {norm_error:.2e} | "
+              f"残留邻居 {stale}")
+
+    if failed:
+        print("❌ 增量更新与全量训练不一致")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
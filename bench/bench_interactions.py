@@ -0,0 +1,160 @@
+# bench/bench_interactions.py
+"""
+基准测试：收藏切换 / 评分写入在并发点击下的表现
+- 旧实现：先 SELECT 再在 Python 里决定 INSERT / UPDATE / DELETE (2~3 次往返，并发时会撞唯一约束)
+- 新实现：interaction_service 的单条语句 (CTE 切换收藏 / INSERT ... ON CONFLICT 写评分)
+每轮模拟同一个用户对同一部电影连续快速点击 CONCURRENCY 次 (并发发出)，
+统计单次点击延迟、失败次数，以及结束后是否出现重复行。
+需要连接数据库，且已运行 init/dedupe_interactions.py；使用 movie_summary 中的电影。
+测试在一个临时用户 (BENCH_USERNAME) 上进行，结束时 (包括中途出错) 删除它的收藏/评分、
+它在只追加的事件表 user_interaction_events 里写下的事件 (按开始时记下的 seq 之后、该用户的范围删除) 以及用户本身，
+下一次增量更新和热门趋势都不会读到这些事件。
+服务运行中的定时增量更新可能在清理之前就读到了这些事件 (临时用户的互动会留在模型里直到下一次全量训练)，
+建议在服务停止时运行。
+
+运行: python bench/bench_interactions.py
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, delete, and_, func
+from database import AsyncSessionLocal
+from models import User, MovieSummary, UserFavorite, UserRating, UserInteractionEvent
+from services import interaction_service, event_log
+from services.auth_service import get_password_hash
+
+# --- 配置区域 ---
+BENCH_USERNAME = "bench_interactions_tmp"  # 临时用户，测试结束后删除
+ROUNDS = 50  # 每轮换一部电影
+CONCURRENCY = 4  # 每轮同时发出的点击数 (双击/连点)
+
+
+async def legacy_toggle_favorite(user_id, tconst):
+    """旧版：SELECT 后再 INSERT / DELETE"""
+    async with AsyncSessionLocal() as db:
+        stmt = select(UserFavorite).where(and_(UserFavorite.user_id == user_id, UserFavorite.tconst == tconst))
+        record = (await db.execute(stmt)).scalars().first()
+        if record:
+            await db.delete(record)
+        else:
+            db.add(UserFavorite(user_id=user_id, tconst=tconst))
+        await db.commit()
+
+
+async def legacy_set_user_rating(user_id, tconst, score):
+    """旧版：SELECT 后再 INSERT / UPDATE"""
+    async with AsyncSessionLocal() as db:
+        stmt = select(UserRating).where(and_(UserRating.user_id == user_id, UserRating.tconst == tconst))
+        record = (await db.execute(stmt)).scalars().first()
+        if record:
+            record.rating = score
+        else:
+            db.add(UserRating(user_id=user_id, tconst=tconst, rating=score))
+        await db.commit()
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    try:
+        await coro
+        return (time.perf_counter() - start) * 1000, None
+    except Exception as e:
+        return (time.perf_counter() - start) * 1000, type(e).__name__
+
+
+async def _cleanup(user_id, tconsts):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(UserFavorite).where(UserFavorite.user_id == user_id, UserFavorite.tconst.in_(tconsts)))
+        await db.execute(delete(UserRating).where(UserRating.user_id == user_id, UserRating.tconst.in_(tconsts)))
+        await db.commit()
+
+
+async def _create_user():
+    """创建临时用户 (上次中途被杀残留的同名用户先清理掉)"""
+    async with AsyncSessionLocal() as db:
+        stale = (await db.execute(select(User.id).where(User.username == BENCH_USERNAME))).scalar()
+    if stale:
+        await _drop_user(stale, after_seq=0)
+
+    async with AsyncSessionLocal() as db:
+        user = User(username=BENCH_USERNAME, hashed_password=get_password_hash(os.urandom(16).hex()), role='user')
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def _drop_user(user_id, after_seq):
+    """删除临时用户的全部互动、after_seq 之后它写下的事件以及用户本身"""
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(UserFavorite).where(UserFavorite.user_id == user_id))
+        await db.execute(delete(UserRating).where(UserRating.user_id == user_id))
+        await db.execute(delete(UserInteractionEvent).where(
+            UserInteractionEvent.user_id == user_id, UserInteractionEvent.seq > after_seq
+        ))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+
+async def _duplicates(model, user_id, tconsts):
+    """结束后同一 (user_id, tconst) 多于一行的数量"""
+    async with AsyncSessionLocal() as db:
+        stmt = (
+            select(model.tconst)
+            .where(model.user_id == user_id, model.tconst.in_(tconsts))
+            .group_by(model.tconst)
+            .having(func.count() > 1)
+        )
+        return len((await db.execute(stmt)).all())
+
+
+async def run_case(name, action, model, user_id, tconsts):
+    samples, errors = [], 0
+    for tconst in tconsts:
+        clicks = [action(user_id, tconst) for _ in range(CONCURRENCY)]
+        for latency, error in await asyncio.gather(*(_timed(c) for c in clicks)):
+            samples.append(latency)
+            errors += error is not None
+
+    duplicates = await _duplicates(model, user_id, tconsts)
+    print(f"   - {name:<16} 中位数 {np.median(samples):7.2f} ms | p99 {np.percentile(samples, 99):7.2f} ms"
+          f" | 失败 {errors:3d}/{len(samples)} | 重复行 {duplicates}")
+    await _cleanup(user_id, tconsts)
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        tconsts = (await db.execute(select(MovieSummary.tconst).limit(ROUNDS * 10))).scalars().all()
+
+    if len(tconsts) < ROUNDS:
+        print("❌ 错误：请先同步 movie_summary")
+        return
+
+    tconsts = random.sample(list(tconsts), ROUNDS)
+    start_seq = await event_log.get_latest_seq()
+    user_id = await _create_user()
+    print(f"🧪 {ROUNDS} 部电影 × 每次并发 {CONCURRENCY} 次点击 (临时用户 {BENCH_USERNAME})")
+
+    score = lambda: round(random.uniform(1, 10), 1)
+    try:
+        await run_case("旧版 收藏切换", legacy_toggle_favorite, UserFavorite, user_id, tconsts)
+        await run_case("新版 收藏切换", interaction_service.toggle_favorite, UserFavorite, user_id, tconsts)
+        await run_case("旧版 评分写入", lambda u, t: legacy_set_user_rating(u, t, score()), UserRating, user_id, tconsts)
+        await run_case("新版 评分写入", lambda u, t: interaction_service.set_user_rating(u, t, score()), UserRating, user_id, tconsts)
+    finally:
+        await _drop_user(user_id, start_seq)
+        print(f"🧹 已删除临时用户及其 seq > {start_seq} 的事件")
+
+
+if __name__ == "__main__":
+    # Windows 补丁
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
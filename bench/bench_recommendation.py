@@ -0,0 +1,95 @@
+# bench/bench_recommendation.py
+"""
+基准测试：get_recommendations 的打分环节
+- 旧实现：逐个种子电影取邻居，在 Python 循环里累加到 dict，再排序
+- 新实现：SimilarityModel.recommend (一次稀疏矩阵乘法 + argpartition)
+使用合成数据，不依赖数据库。输出中位数和 p99 延迟。
+
+运行: python bench/bench_recommendation.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import similarity_model
+
+# --- 配置区域 ---
+NUM_USERS = 5000
+NUM_ITEMS = 20000
+INTERACTIONS_PER_USER = 60
+NUM_RATINGS = 20  # 重度用户：20 条评分
+NUM_FAVORITES = 300  # + 几百条收藏
+ROUNDS = 200
+
+
+def legacy_scores(model, watched_movies, limit=100):
+    """旧版逐种子 Python 循环 (与原 get_recommendations 逻辑一致)"""
+    candidate_scores = {}
+    seed_idx = model.index_of(list(watched_movies.keys()))
+    for (watched_tconst, weight), idx in zip(watched_movies.items(), seed_idx):
+        if idx < 0:
+            continue
+        neighbor_idx, similarities = model.neighbors(idx)
+        for similar_tconst, similarity in zip(model.item_ids[neighbor_idx], similarities):
+            similar_tconst = str(similar_tconst)
+            if similar_tconst in watched_movies:
+                continue
+            candidate_scores[similar_tconst] = candidate_scores.get(similar_tconst, 0) + float(similarity) * weight
+    return [t for t, _ in sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)[:limit]]
+
+
+def vectorized_scores(model, watched_movies, limit=100):
+    seed_idx = model.index_of(list(watched_movies.keys()))
+    candidate_idx, _ = model.recommend(seed_idx, list(watched_movies.values()), n=limit)
+    return [str(t) for t in model.item_ids[candidate_idx]]
+
+
+def timed(fn, *args):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples), np.percentile(samples, 99)
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"🧪 生成合成数据: {NUM_USERS} 用户 × {INTERACTIONS_PER_USER} 互动, {NUM_ITEMS} 部电影")
+
+    # 热门长尾分布，更接近真实数据
+    popularity = 1.0 / np.arange(1, NUM_ITEMS + 1) ** 0.8
+    popularity /= popularity.sum()
+    n = NUM_USERS * INTERACTIONS_PER_USER
+    user_ids = np.repeat(np.arange(NUM_USERS), INTERACTIONS_PER_USER)
+    item_pool = np.array([f"tt{i:07d}" for i in range(NUM_ITEMS)])
+    tconsts = item_pool[rng.choice(NUM_ITEMS, size=n, p=popularity)]
+    values = rng.uniform(3.0, 10.0, size=n).round(1)
+
+    start = time.perf_counter()
+    model = similarity_model.train(user_ids, tconsts, values)
+    print(f"✅ 训练完成: {model.item_count} 部电影, {model.similarity.nnz} 个邻居, "
+          f"耗时 {time.perf_counter() - start:.2f}s")
+
+    # 重度用户的种子
+    picks = rng.choice(model.item_count, size=NUM_RATINGS + NUM_FAVORITES, replace=False)
+    watched = {str(model.item_ids[i]): float(rng.uniform(3, 10)) for i in picks[:NUM_RATINGS]}
+    for i in picks[NUM_RATINGS:]:
+        watched[str(model.item_ids[i])] = 10.0
+
+    # 结果一致性检查 (分数相同时顺序可能不同，只比较集合)
+    overlap = len(set(legacy_scores(model, watched)) & set(vectorized_scores(model, watched)))
+    print(f"🔍 Top-100 结果重合: {overlap}/100")
+
+    for name, fn in (("旧版 Python 循环", legacy_scores), ("向量化打分", vectorized_scores)):
+        median, p99 = timed(fn, model, watched)
+        print(f"   - {name:<12} 中位数 {median:8.3f} ms | p99 {p99:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# bench/eval_recommenders.py
+"""
+离线评估：ALS / Item-CF / 热门兜底 三种推荐的排序质量与延迟
+- 数据：user_personal_ratings + user_favorites (收藏记 10 分，同一部电影既评分又收藏取较高值)
+- 划分：每个用户按时间留出最新的 k 条互动 (--split time)，或随机留出 k 条 (--split random)
+- 训练：只用训练集重新训练 ALS (services/als_engine) 和 Item-CF (services/similarity_model)，不动线上模型；
+  ALS 与 spark_runner 一致：用合并后的评分 + 收藏训练，超参数取 spark_runner.load_als_params() (--implicit 可覆盖)
+- 热门兜底：与线上一致的 movie_summary 热门池 (movie_service)，去掉用户训练集里已有的电影
+- 指标：precision@k / recall@k / NDCG@k、覆盖率、单用户推荐延迟；用户分块后在进程池中并行计算
+- 输出：终端汇总 + JSON 报告 (默认 data/reports/eval_<时间>.json)
+
+运行: python bench/eval_recommenders.py [--split time|random] [--k 10] [--workers 4] [--implicit]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func
+from database import AsyncSessionLocal
+from models import UserRating, UserFavorite
+import spark_runner
+from services import als_engine, evaluation, factor_model, movie_service, similarity_model
+
+# --- 配置区域 ---
+REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "reports")
+CHUNK_USERS = 200  # 每个进程池任务包含的用户数
+SEED_RATINGS = 20  # Item-CF 种子：评分最高的 20 部 + 全部收藏 (与 recommendation_service 一致)
+
+_state = {}  # 工作进程内的模型与用户数据 (进程池 initializer 设置)
+
+
+async def load_interactions():
+    """
+    读取评分和收藏，按 (user_id, tconst) 合并
+    :return: [(user_id, tconst, 分值, 时间戳, 是否收藏)]
+    """
+    async with AsyncSessionLocal() as db:
+        ratings = (await db.execute(select(
+            UserRating.user_id, UserRating.tconst, UserRating.rating,
+            func.coalesce(UserRating.updated_at, UserRating.created_at)
+        ))).all()
+        favorites = (await db.execute(select(
+            UserFavorite.user_id, UserFavorite.tconst, UserFavorite.created_at
+        ))).all()
+
+    merged = {}
+    for user_id, tconst, rating, ts in ratings:
+        merged[(user_id, tconst)] = [rating or 0.0, ts.timestamp() if ts else 0.0, False]
+    for user_id, tconst, ts in favorites:
+        entry = merged.setdefault((user_id, tconst), [10.0, 0.0, True])
+        entry[0], entry[2] = 10.0, True
+        entry[1] = max(entry[1], ts.timestamp() if ts else 0.0)
+    return [(u, t, v, ts, fav) for (u, t), (v, ts, fav) in merged.items()]
+
+
+async def load_popular_pool():
+    """与线上一致的热门池 ("全部" 分类)"""
+    await movie_service.warm_popular_pools()
+    return [m.tconst for m in movie_service.get_popular_movies('all', movie_service.POPULAR_POOL_SIZE)]
+
+
+async def load_data():
+    return await load_interactions(), await load_popular_pool()
+
+
+def build_state(interactions, test_mask, popular_pool, als_params=None, log=print):
+    """
+    只用训练集训练两个模型，并整理每个用户的种子、已看和测试集中的相关电影
+    :param als_params: ALS 超参数 (缺省为 spark_runner.DEFAULT_ALS_PARAMS)
+    """
+    als_params = {**spark_runner.DEFAULT_ALS_PARAMS, **(als_params or {})}
+    user_ids = np.array([r[0] for r in interactions], dtype=np.int64)
+    tconsts = np.array([r[1] for r in interactions])
+    values = np.array([r[2] for r in interactions], dtype=np.float32)
+    favorites = np.array([r[4] for r in interactions], dtype=bool)
+    train = ~test_mask
+
+    log(f"🧠 训练 Item-CF ({int(train.sum())} 条训练互动)...")
+    item_cf = similarity_model.train(user_ids[train], tconsts[train], values[train])
+
+    # ALS 与 spark_runner 一致：评分 + 收藏合并后的全部训练互动
+    # 显式模式的目标是合并后的分值；隐式模式的强度是 评分/10，收藏记 FAVORITE_STRENGTH
+    log(f"🧠 训练 ALS ({'隐式' if als_params['implicit'] else '显式'}反馈)...")
+    strengths = np.where(favorites, spark_runner.FAVORITE_STRENGTH, values / 10.0).astype(np.float32)
+    targets = strengths if als_params["implicit"] else values
+    factors = als_engine.train(user_ids[train], tconsts[train], targets[train], nonnegative=True, **als_params)
+    als = factor_model.from_factors(
+        factors.user_ids, factors.user_factors, factors.item_ids, factors.item_factors,
+        user_ids[train], tconsts[train]
+    )
+
+    seeds, seen, relevant = {}, {}, {}
+    for user_id, tconst, value, is_favorite, is_test in zip(user_ids, tconsts, values, favorites, test_mask):
+        user_id, tconst = int(user_id), str(tconst)
+        if is_test:
+            if value >= evaluation.RELEVANT_MIN:
+                relevant.setdefault(user_id, set()).add(tconst)
+            continue
+        seen.setdefault(user_id, set()).add(tconst)
+        seeds.setdefault(user_id, ([], []))
+        seeds[user_id][1 if is_favorite else 0].append((tconst, float(value)))
+
+    for user_id, (rated_seeds, favorite_seeds) in seeds.items():
+        rated_seeds.sort(key=lambda x: x[1], reverse=True)
+        picked = dict(rated_seeds[:SEED_RATINGS])
+        picked.update(favorite_seeds)
+        seeds[user_id] = (list(picked), list(picked.values()))
+
+    return {
+        "item_cf": item_cf,
+        "als": als,
+        "popular": popular_pool,
+        "seeds": seeds,
+        "seen": seen,
+        "relevant": relevant,
+        "catalog_size": len(np.unique(tconsts[train])),
+    }
+
+
+# --- 被评估的推荐器：(user_id, n) -> tconst 列表 ---
+def recommend_als(user_id, n):
+    model = _state["als"]
+    item_idx, _ = model.recommend(user_id, n=n)
+    return [str(t) for t in model.item_ids[item_idx]]
+
+
+def recommend_item_cf(user_id, n):
+    model = _state["item_cf"]
+    tconsts, weights = _state["seeds"].get(user_id, ([], []))
+    if not tconsts:
+        return []
+    item_idx, _ = model.recommend(model.index_of(tconsts), weights, n=n)
+    return [str(t) for t in model.item_ids[item_idx]]
+
+
+def recommend_popular(user_id, n):
+    seen = _state["seen"].get(user_id, ())
+    return [t for t in _state["popular"] if t not in seen][:n]
+
+
+RECOMMENDERS = {
+    "als": recommend_als,
+    "item_cf": recommend_item_cf,
+    "popular": recommend_popular,
+}
+
+
+def _init_worker(state):
+    _state.update(state)
+
+
+def _evaluate_chunk(user_ids, k):
+    """
+    工作进程：一块用户 × 每个推荐器
+    :return: {推荐器: ([(precision, recall, ndcg, 延迟 ms, 推荐条数)], 推荐过的电影集合)}
+    """
+    results = {name: ([], set()) for name in RECOMMENDERS}
+    for user_id in user_ids:
+        relevant = _state["relevant"][user_id]
+        for name, recommend in RECOMMENDERS.items():
+            start = time.perf_counter()
+            recommended = recommend(user_id, k)
+            latency = (time.perf_counter() - start) * 1000
+            rows, items = results[name]
+            rows.append((*evaluation.ranking_metrics(recommended, relevant, k), latency, len(recommended)))
+            items.update(recommended)
+    return results
+
+
+def evaluate(state, k, workers):
+    """按用户分块并行评估，返回 {推荐器: 汇总指标}"""
+    users = sorted(state["relevant"])
+    chunks = [users[i:i + CHUNK_USERS] for i in range(0, len(users), CHUNK_USERS)]
+    merged = {name: ([], set()) for name in RECOMMENDERS}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+        for result in pool.map(_evaluate_chunk, chunks, [k] * len(chunks)):
+            for name, (rows, items) in result.items():
+                merged[name][0].extend(rows)
+                merged[name][1].update(items)
+
+    return {
+        name: evaluation.summarize(rows, items, state["catalog_size"])
+        for name, (rows, items) in merged.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐算法离线评估")
+    parser.add_argument("--split", choices=["time", "random"], default="time", help="测试集划分方式")
+    parser.add_argument("--holdout", type=int, default=evaluation.HOLDOUT_K, help="每个用户留出的互动数")
+    parser.add_argument("--k", type=int, default=evaluation.TOP_K, help="推荐列表长度")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument("--output", default=None, help="JSON 报告路径")
+    parser.add_argument("--implicit", action="store_true", help="ALS 使用隐式反馈模式 (与 spark_runner --implicit 一致)")
+    args = parser.parse_args()
+
+    als_params = spark_runner.load_als_params()
+    if args.implicit:
+        als_params["implicit"] = True
+
+    print("📥 读取互动数据...")
+    interactions, popular_pool = asyncio.run(load_data())
+    if not interactions:
+        print("⚠️ 没有互动数据，无法评估")
+        return
+
+    test_mask = evaluation.holdout_split(
+        [r[0] for r in interactions], [r[3] for r in interactions], k=args.holdout, mode=args.split
+    )
+    print(f"✂️ 划分完成：{len(interactions)} 条互动，其中测试 {int(test_mask.sum())} 条 ({args.split})")
+
+    start = time.perf_counter()
+    state = build_state(interactions, test_mask, popular_pool, als_params)
+    train_seconds = time.perf_counter() - start
+    print(f"✅ 训练完成，耗时 {train_seconds:.1f}s；{len(state['relevant'])} 个用户参与评估")
+
+    start = time.perf_counter()
+    summary = evaluate(state, args.k, args.workers)
+    eval_seconds = time.perf_counter() - start
+
+    print(f"\n📊 评估结果 (k = {args.k})")
+    for name, metrics in summary.items():
+        if not metrics.get("users"):
+            print(f"   - {name:<8} 无可评估用户")
+            continue
+        print(f"   - {name:<8} P@k {metrics['precision']:.4f} | R@k {metrics['recall']:.4f} | "
+              f"NDCG@k {metrics['ndcg']:.4f} | 覆盖率 {metrics['coverage']:.4f} | "
+              f"p50 {metrics['latency_ms']['p50']:.3f} ms | p95 {metrics['latency_ms']['p95']:.3f} ms")
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "split": {"mode": args.split, "holdout": args.holdout, "min_train": evaluation.MIN_TRAIN,
+                  "relevant_min": evaluation.RELEVANT_MIN},
+        "k": args.k,
+        "als_params": als_params,
+        "interactions": len(interactions),
+        "test_interactions": int(test_mask.sum()),
+        "catalog_size": state["catalog_size"],
+        "timing_seconds": {"train": round(train_seconds, 3), "evaluate": round(eval_seconds, 3)},
+        "recommenders": summary,
+    }
+    output = args.output or os.path.join(REPORT_DIR, f"eval_{datetime.now():%Y%m%d%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 报告已写入 {output}")
+
+
+if __name__ == "__main__":
+    # Windows 补丁
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    main()
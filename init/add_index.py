@@ -1,14 +1,42 @@
 import asyncio
 from sqlalchemy import text
 from database import engine
+from services.movie_service import CATEGORY_BITS
 
 async def add_indexes():
     async with engine.begin() as conn:
         print("正在为 title_basics 表添加索引，数据量大可能需要几分钟...")
         # 为 titleType 添加索引，加速 WHERE titletype IN (...)
         await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_title_basics_titletype ON title_basics (titletype)"))
-        # 为 primaryTitle 添加索引，加速搜索
+        # 为 primaryTitle 添加索引，加速按标题精确查找/排序 (模糊搜索走下面的 trigram 索引)
         await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_title_basics_primarytitle ON title_basics (primarytitle)"))
+
+        print("正在添加搜索索引 (pg_trgm)，数据量大可能需要较长时间...")
+        # 与 services/search_service.py 配套：GIN trigram 索引支撑 ILIKE '%关键词%' 和 similarity() 排序
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        search_columns = [
+            ("title_basics", "primarytitle", "title_basics_title"),
+            ("movie_summary", '"primaryTitle"', "movie_summary_title"),
+            ("name_basics", "primaryname", "name_basics_name"),
+        ]
+        for table, column, name in search_columns:
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{name}_trgm ON {table} USING gin ({column} gin_trgm_ops)"
+            ))
+
+        print("正在为 movie_summary 添加首页游标分页索引...")
+        # 支撑 ORDER BY "numVotes" DESC NULLS LAST, tconst DESC 以及 (numVotes, tconst) < (?, ?) 的游标条件
+        await conn.execute(text('CREATE INDEX IF NOT EXISTS ix_movie_summary_votes_tconst ON movie_summary ("numVotes" DESC NULLS LAST, tconst DESC)'))
+
+        print("正在为首页各分类添加部分索引...")
+        # 与 movie_service.category_clause() 生成的条件一致，分类浏览变成索引范围扫描
+        for category, bit in CATEGORY_BITS.items():
+            await conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS ix_movie_summary_cat_{category} '
+                f'ON movie_summary ("numVotes" DESC NULLS LAST, tconst DESC) '
+                f'WHERE (category_mask & {bit}) <> 0'
+            ))
+
         print("✅ 索引添加完成！")
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+# init/backfill_events.py
+"""
+迁移：用现有的评分/收藏为 user_interaction_events 补一份初始事件
+上线事件流水之前的互动只有当前状态，这里按时间顺序各补一条 rate / favorite 事件，
+热门趋势、离线分析等下游就能从 seq = 0 开始读到完整历史。
+只在事件表为空时执行。
+"""
+import asyncio
+import os
+import sys
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+from services.event_log import EVENT_RATE, EVENT_FAVORITE
+
+
+async def backfill_events():
+    async with engine.begin() as conn:
+        exists = (await conn.execute(text("SELECT 1 FROM user_interaction_events LIMIT 1"))).scalar()
+        if exists:
+            print("⚠️ 事件表已有数据，跳过回填")
+            return
+
+        print("🔄 正在回填历史互动事件...")
+        result = await conn.execute(text(f"""
+            INSERT INTO user_interaction_events (user_id, tconst, event_type, value, created_at)
+            SELECT user_id, tconst, event_type, value, ts
+            FROM (
+                SELECT user_id, tconst, '{EVENT_RATE}' AS event_type, rating AS value,
+                       COALESCE(updated_at, created_at) AS ts
+                FROM user_personal_ratings
+                UNION ALL
+                SELECT user_id, tconst, '{EVENT_FAVORITE}', NULL, created_at
+                FROM user_favorites
+            ) history
+            ORDER BY ts NULLS FIRST
+        """))
+        print(f"✅ 回填完成，共 {result.rowcount} 条事件")
+
+
+if __name__ == "__main__":
+    # Windows 补丁
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(backfill_events())
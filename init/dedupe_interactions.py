@@ -0,0 +1,58 @@
+# init/dedupe_interactions.py
+"""
+迁移：清理重复的评分/收藏，并补上 (user_id, tconst) 唯一约束
+
+interaction_service 的写入改成了 INSERT ... ON CONFLICT，依赖这两个约束：
+- user_personal_ratings.uix_user_rating：之前没有，旧数据里同一用户同一电影可能有多条评分
+  (重复数据会让推荐训练重复计权)，保留最后修改的那一条
+- user_favorites.uix_user_favorite：模型里早就有，但较早建的库可能缺失，保留最早收藏的那一条
+可重复执行
+"""
+import asyncio
+import os
+import sys
+
+# --- 路径修正：确保能导入项目根目录的模块 ---
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+
+# (表名, 约束名, 保留哪一条的排序：排第一的保留)
+TABLES = [
+    ("user_personal_ratings", "uix_user_rating", "updated_at DESC NULLS LAST, id DESC"),
+    ("user_favorites", "uix_user_favorite", "created_at ASC NULLS LAST, id ASC"),
+]
+
+
+async def dedupe_interactions():
+    async with engine.begin() as conn:
+        for table, constraint, keep_order in TABLES:
+            print(f"🔍 正在清理 {table} 中的重复记录...")
+            result = await conn.execute(text(f"""
+                DELETE FROM {table} t
+                USING (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, tconst ORDER BY {keep_order}) AS rn
+                    FROM {table}
+                ) d
+                WHERE t.id = d.id AND d.rn > 1
+            """))
+            print(f"   - 删除重复记录 {result.rowcount} 条")
+
+            exists = (await conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": constraint}
+            )).scalar()
+            if exists:
+                print(f"   - 约束 {constraint} 已存在")
+            else:
+                await conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} UNIQUE (user_id, tconst)"))
+                print(f"   - ✅ 已添加约束 {constraint}")
+
+    print("✅ 去重迁移完成！")
+
+
+if __name__ == "__main__":
+    # Windows 补丁
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(dedupe_interactions())
@@ -4,7 +4,8 @@ from sqlalchemy import inspect, text
 from database import engine, Base
 # 确保导入了所有模型，这样 Base.metadata 才能获取到它们
 from models import TitleBasics, TitleRatings, User, UserFavorite, UserRating, MovieSummary, TitleCrew, NameBasics, \
-    TitleEpisode, SparkRecommendation, MovieBoxOffice, DoubanTop250
+    TitleEpisode, SparkRecommendation, MovieBoxOffice, DoubanTop250, UserInteractionEvent, \
+    TrendingCounter, SegmentRecommendation, RecommendationRun, AlsTrial
 
 
 def check_and_upgrade_tables(conn):
@@ -9,8 +9,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy import select
 from database import AsyncSessionLocal
-from models import User, MovieSummary, UserRating, TitleBasics, UserFavorite  # 【新增】UserFavorite
+from models import User, MovieSummary, UserRating, TitleBasics, UserFavorite, UserInteractionEvent
 from services.auth_service import get_password_hash
+from services.event_log import EVENT_RATE, EVENT_FAVORITE
 
 # --- 配置区域 ---
 NUM_FAKE_USERS = 50  # 生成 50 个虚拟用户
@@ -85,8 +86,9 @@ async def seed_data():
             return
 
         # 4. 生成评分 & 收藏
-        new_ratings = []
-        new_favorites = []
+        # 每条互动同时追加一条事件 (与线上写入一致)，增量更新才能看到这些模拟数据
+        new_ratings, rating_events = [], []
+        new_favorites, favorite_events = [], []
 
         print("⏳ 正在计算互动数据...")
         for user in all_bots:
@@ -96,12 +98,16 @@ async def seed_data():
             for tconst in rate_movies:
                 score = round(random.uniform(3.0, 10.0), 1)
                 new_ratings.append(UserRating(user_id=user.id, tconst=tconst, rating=score))
+                rating_events.append(UserInteractionEvent(
+                    user_id=user.id, tconst=tconst, event_type=EVENT_RATE, value=score
+                ))
 
             # --- B. 生成收藏 (新增逻辑) ---
             # 随机选 N 部电影收藏 (可以和评分的电影重叠，这很正常)
             fav_movies = random.sample(movie_ids, min(len(movie_ids), FAVORITES_PER_USER))
             for tconst in fav_movies:
                 new_favorites.append(UserFavorite(user_id=user.id, tconst=tconst))
+                favorite_events.append(UserInteractionEvent(user_id=user.id, tconst=tconst, event_type=EVENT_FAVORITE))
 
         # 5. 批量写入 (分开写入以处理异常)
 
@@ -111,7 +117,8 @@ async def seed_data():
                 # 簡單去重逻辑太复杂，直接依赖数据库不做处理，或者分批
                 # 这里为了演示方便，采用“暴力尝试”法，实际生产应用 insert on conflict
                 for i in range(0, len(new_ratings), 500):
-                    db.add_all(new_ratings[i:i + 500])
+                    # 互动和对应的事件在同一个事务里提交，一批失败时两者一起回滚
+                    db.add_all(new_ratings[i:i + 500] + rating_events[i:i + 500])
                     await db.commit()
                 print(f"✅ 评分数据写入尝试完成 (目标: {len(new_ratings)} 条)")
         except Exception as e:
@@ -122,7 +129,7 @@ async def seed_data():
         try:
             if new_favorites:
                 for i in range(0, len(new_favorites), 500):
-                    db.add_all(new_favorites[i:i + 500])
+                    db.add_all(new_favorites[i:i + 500] + favorite_events[i:i + 500])
                     await db.commit()
                 print(f"✅ 收藏数据写入尝试完成 (目标: {len(new_favorites)} 条)")
         except Exception as e:
@@ -1,5 +1,5 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from nicegui import ui, app
 from pages import (
     admin_dashboard, login_page, user_management,
@@ -7,7 +7,7 @@ from pages import (
     crew_management, register_page, user_home, episode_management, user_favorites, user_ratings, movie_detail,
     admin_analytics
 )
-from services import recommendation_service
+from services import movie_service, recommendation_service, search_service, segment_service, trending_service
 
 # 定义 FastAPI
 app_fastapi = FastAPI()
@@ -156,16 +156,47 @@ def page_user_ratings():
         return
     user_ratings.create_page()
 
+# --- 4. 推荐模型管理接口 (管理员) ---
+def require_admin_api():
+    if not app.storage.user.get('authenticated', False) or app.storage.user.get('role', 'user') != 'admin':
+        raise HTTPException(status_code=403, detail='需要管理员权限')
+
+
+@app.get('/api/admin/recommendation/status')
+def recommendation_status():
+    require_admin_api()
+    return recommendation_service.get_model_status()
+
+
+@app.post('/api/admin/recommendation/train')
+async def recommendation_train():
+    require_admin_api()
+    started, msg = recommendation_service.start_background_training()
+    return {'started': started, 'message': msg, 'status': recommendation_service.get_model_status()}
+
+
 # 【新增】启动事件：加载本地模型
 def handle_startup():
     print("🚀 系统启动中...")
     recommendation_service.load_model()
+    recommendation_service.load_als_model()
+    # 定时检查模型版本，其它进程训练出的新版本也能热切换
+    app.timer(30, recommendation_service.reload_if_changed)
+    # 定时把新评分/收藏增量合入模型，"猜你喜欢" 几分钟内即可反映最新互动
+    app.timer(120, recommendation_service.run_scheduled_update)
+    # 实时热门：启动时从检查点恢复，之后定时写回数据库
+    app.timer(60, trending_service.checkpoint)
 
 @ui.page('/movie/{tconst}')
 def movie_detail_route(tconst: str):
     movie_detail.create_detail_page(tconst)
 
 app.on_startup(handle_startup)
+app.on_startup(trending_service.restore)
+app.on_startup(movie_service.warm_popular_pools)
+app.on_startup(segment_service.load_segments)
+app.on_startup(search_service.detect_trgm)
+app.on_shutdown(trending_service.checkpoint)
 
 # --- 启动配置 ---
 # 注意：storage_secret 是 Session 加密必须的
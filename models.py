@@ -123,6 +123,11 @@ class MovieSummary(Base):
     # 【新增】缓存海报，提高首页加载速度
     poster_path = Column(String, nullable=True)
 
+    # 【新增】重建缓存时预先算好的分类位 / 题材位 (见 movie_service.CATEGORY_BITS / GENRE_BITS)
+    # 首页按分类筛选走部分索引，不再对 genres 做 ILIKE 全表扫描
+    category_mask = Column(Integer, default=0)
+    genre_mask = Column(BigInteger, default=0)
+
 # 6. 用户收藏表
 class UserFavorite(Base):
     __tablename__ = "user_favorites"
@@ -146,6 +151,58 @@ class UserRating(Base):
     tconst = Column(String, ForeignKey("title_basics.tconst"), index=True)
     rating = Column(Float)  # 用户打分 (e.g. 1.0 - 10.0)
     created_at = Column(DateTime, default=datetime.now)
+    # 【新增】修改评分时更新 (增量训练改按互动事件流水的 seq 查找变化，这一列不再需要索引)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # 每个用户对每部电影只有一条评分 (upsert 的冲突目标，同时充当联合索引)
+    # 已有重复数据的库需先运行 init/dedupe_interactions.py 去重
+    __table_args__ = (
+        UniqueConstraint('user_id', 'tconst', name='uix_user_rating'),
+    )
+
+
+class UserInteractionEvent(Base):
+    """
+    用户互动事件流水 (只追加，不修改不删除)
+    评分/收藏表只保存当前状态，这里按时间顺序记录每一次变化，
+    推荐模型增量更新、热门趋势等下游按 seq 区间读取"上次处理之后的新事件"
+    """
+    __tablename__ = "user_interaction_events"
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)  # 单调递增的事件序号
+    user_id = Column(Integer, index=True)
+    tconst = Column(String)
+    event_type = Column(String(16))  # rate / unrate / favorite / unfavorite
+    value = Column(Float, nullable=True)  # rate 事件的分数
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class TrendingCounter(Base):
+    """
+    热门趋势计数器的检查点 (trending_service 定期写入，重启后恢复)
+    count 是写入时刻 (saved_at) 的衰减后热度
+    """
+    __tablename__ = "trending_counters"
+
+    category = Column(String(16), primary_key=True)  # all / movie / tv / anime / variety / doc
+    tconst = Column(String, primary_key=True)
+    count = Column(Float)  # 衰减后的热度
+    error = Column(Float)  # Space-Saving 的高估上界
+    saved_at = Column(DateTime, default=datetime.now)
+
+
+class SegmentRecommendation(Base):
+    """
+    人群分段推荐 (segment_service 离线生成)
+    segment 形如 "M|25-34|Engineer (工程师)"，"*" 表示该维度不限
+    用于有画像 (性别/年龄/职业) 但还没有任何互动的新用户
+    """
+    __tablename__ = "segment_recommendations"
+
+    segment = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)  # 段内排名 (从 1 开始)
+    tconst = Column(String)
+    score = Column(Float)  # 段内加权互动数
 
 
 class SparkRecommendation(Base):
@@ -159,6 +216,49 @@ class SparkRecommendation(Base):
     tconst = Column(String, index=True)    # 推荐了哪部电影
     score = Column(Float)                  # 推荐分数 (预测评分)
     algorithm = Column(String, default="ALS") # 算法名称，方便以后对比
+    run_id = Column(Integer)               # 生成这批结果的 recommendation_runs.id
+
+
+class RecommendationRun(Base):
+    """
+    spark_runner 每次发布 spark_recommendations 的记录
+    结果先 COPY 进暂存表，建好索引后在一个事务里改名替换，同时把本次记录标为 active，
+    所以 status = 'active' 的那一条就是线上表里的全部数据，读者不会看到写了一半的结果
+    """
+    __tablename__ = "recommendation_runs"
+
+    id = Column(Integer, primary_key=True)
+    engine = Column(String(16))  # spark / numpy
+    rmse = Column(Float)
+    factor_version = Column(String)  # 同一次训练导出的因子版本 (model_store)
+    row_count = Column(Integer)
+    status = Column(String(16), default="loading")  # loading -> active -> superseded；出错为 failed
+    started_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime)
+
+
+class AlsTrial(Base):
+    """
+    ALS 调参记录 (spark_runner --tune)
+    每个候选组合一行；同一次搜索共用 search_id，被晋升为线上参数的那一行 promoted = True
+    """
+    __tablename__ = "als_trials"
+
+    id = Column(Integer, primary_key=True)
+    search_id = Column(String(32), index=True)
+    rank = Column(Integer)
+    reg_param = Column(Float)
+    alpha = Column(Float)
+    implicit = Column(Boolean)
+    max_iter = Column(Integer)
+    rmse = Column(Float)  # 隐式反馈组合为空
+    precision = Column(Float)  # 以下为测试集上的 @k 排序指标
+    recall = Column(Float)
+    ndcg = Column(Float)
+    train_seconds = Column(Float)
+    eval_seconds = Column(Float)
+    promoted = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.now)
 
 
 class DoubanTop250(Base):
@@ -56,36 +56,47 @@ def create_admin_page():
                 train_btn = ui.button('立即重新训练', icon='psychology', on_click=lambda: run_training()) \
                     .props('unelevated color=purple')
 
-            # 训练逻辑
+            # 训练逻辑：在后台进程中训练，完成后自动热切换，不阻塞页面
             async def run_training():
-                train_btn.disable()
-                train_btn.text = '训练中(约需几秒)...'
-                model_status_label.text = '⏳ 正在计算相似度矩阵...'
-
-                # 调用后台服务
-                success, msg = await recommendation_service.train_model()
-
-                if success:
-                    ui.notify(msg, type='positive')
-                    refresh_status()  # 刷新显示的文字
-                else:
-                    ui.notify(msg, type='negative')
-                    model_status_label.text = '❌ 上次训练失败'
-
-                train_btn.text = '立即重新训练'
-                train_btn.enable()
+                started, msg = recommendation_service.start_background_training()
+                ui.notify(msg, type='info' if started else 'warning')
+                refresh_status()
 
             # 刷新状态文字的辅助函数
             def refresh_status():
-                if recommendation_service._similarity_df is not None:
-                    model_status_label.text = f"✅ 模型已加载 | 算法: Item-Based CF"
+                status = recommendation_service.get_model_status()
+
+                if status['training']:
+                    train_btn.disable()
+                    train_btn.text = '后台训练中...'
+                else:
+                    train_btn.enable()
+                    train_btn.text = '立即重新训练'
+
+                if status['loaded']:
+                    built_at = status['built_at'][:19].replace('T', ' ')
+                    model_status_label.text = (
+                        f"✅ 模型已加载 | 算法: Item-Based CF | 版本: {status['version']} | "
+                        f"构建于: {built_at} | 电影数: {status['item_count']:,}"
+                    )
                     model_status_label.classes('text-green-600', remove='text-grey-6 text-red-600')
                 else:
                     model_status_label.text = "⚠️ 模型未加载 (当前使用热门榜单降级策略)"
                     model_status_label.classes('text-red-600', remove='text-grey-6 text-green-600')
 
-            # 进入页面时自动检测一次
+                cache = status['cache']
+                model_status_label.text += (
+                    f" | 推荐缓存: 命中 {cache['hits']} / 未命中 {cache['misses']} ({cache['hit_rate']:.0%})"
+                )
+
+                if status['training']:
+                    model_status_label.text += ' | ⏳ 正在训练新版本...'
+                elif status['last_error']:
+                    model_status_label.text += f" | ❌ 上次训练失败: {status['last_error']}"
+
+            # 进入页面时自动检测一次，之后定时刷新 (训练完成后自动显示新版本)
             refresh_status()
+            ui.timer(3, refresh_status)
 
         # --- 图表区域 ---
         with ui.row().classes('w-full gap-4'):
@@ -1,7 +1,7 @@
 from nicegui import ui, app
 
 from pages import movie_detail
-from services import movie_service, analysis_service, interaction_service, recommendation_service
+from services import movie_service, analysis_service, interaction_service, home_service
 import random
 import math
 
@@ -98,12 +98,22 @@ def create_user_home():
     # [新增] 当前选中的分类 (默认全部)
     current_category = {'value': 'all'}
 
+    # 游标分页：cursors[i] 是第 i+1 页的起点 (上一页最后一条)，上一页 = 出栈，下一页 = 入栈
     pagination = {
         'page': 1,
         'page_size': 24,
-        'total_pages': 1
+        'total_pages': 1,
+        'cursors': [None],
+        'next_cursor': None,
+        'query': None
     }
 
+    def reset_pager(query=None):
+        pagination['page'] = 1
+        pagination['cursors'] = [None]
+        pagination['next_cursor'] = None
+        pagination['query'] = query
+
     # --- 顶部导航栏 ---
     with ui.header().classes('bg-white text-slate-900 shadow-sm border-b items-center h-16 px-6'):
         with ui.row().classes('items-center gap-2 cursor-pointer'):
@@ -152,15 +162,20 @@ def create_user_home():
         """
         翻页处理
         """
-        new_page = pagination['page'] + delta
-        if new_page < 1 or new_page > pagination['total_pages']:
+        if delta > 0 and pagination['next_cursor'] is None:
+            return
+        if delta < 0 and pagination['page'] <= 1:
             return
 
         # 【修改点】先执行滚动，再加载数据
         # 这样做的时候，按钮还存在，上下文是安全的
         ui.run_javascript('window.scrollTo(0, 0)')
 
-        pagination['page'] = new_page
+        if delta > 0:
+            pagination['cursors'].append(pagination['next_cursor'])
+        else:
+            pagination['cursors'].pop()
+        pagination['page'] = len(pagination['cursors'])
 
         # 加载数据 (这一步会执行 content_div.clear() 删除旧按钮)
         await load_movies(query=search_input.value)
@@ -213,26 +228,34 @@ def create_user_home():
     async def load_movies(query=None):
         content_div.clear()
 
-        # 预加载用户数据
-        my_favs = set()
-        my_ratings = {}
-        if is_login and user_id:
-            my_favs = await interaction_service.get_user_favorite_ids(user_id)
-            my_ratings = await interaction_service.get_user_ratings_map(user_id)
+        # 搜索词变化时回到第一页
+        if (query or None) != pagination['query']:
+            reset_pager(query or None)
 
-        total_count = await movie_service.get_homepage_movie_count(
+        # 并发加载：当前页、计数、用户收藏/评分、侧边栏推荐
+        data = await home_service.load_home_data(
+            user_id=user_id if is_login else None,
             search_query=query,
-            category=current_category['value']
+            category=current_category['value'],
+            page_size=pagination['page_size'],
+            after=pagination['cursors'][-1],
+            with_sidebar=not query,
+            with_trending=not query
         )
+        my_favs = data.favorite_ids
+        my_ratings = data.ratings
+        movies, pagination['next_cursor'] = data.movies, data.next_cursor
+        total_count = data.total_count
 
         pagination['total_pages'] = math.ceil(total_count / pagination['page_size']) if total_count > 0 else 1
+        # 搜索结果采用封顶计数，触顶时页码显示为 "N+"
+        total_label = str(pagination['total_pages'])
+        if movie_service.is_capped_count(total_count):
+            pagination['total_pages'] = max(pagination['total_pages'] - 1, pagination['page'])
+            total_label = f"{pagination['total_pages']}+"
 
         cat_val = current_category['value']
 
-        # 修正当前页码 (防止搜索后页码超出范围)
-        if pagination['page'] > pagination['total_pages']:
-            pagination['page'] = 1
-
         with content_div:
             with ui.column().classes('w-full max-w-[1400px] p-6 gap-6'):
 
@@ -265,6 +288,30 @@ def create_user_home():
                                     .props(f'{btn_props} rounded color={btn_color}') \
                                     .classes('px-5 font-bold transition-all')
 
+                # 2.5 正在流行 (站内实时互动热度，随分类切换)
+                if data.trending:
+                    with ui.column().classes('w-full gap-3'):
+                        with ui.row().classes('items-center gap-2'):
+                            ui.icon('local_fire_department', color='red').classes('text-xl')
+                            ui.label('正在流行').classes('text-xl font-bold text-slate-800')
+                            ui.label('根据站内最近的收藏与评分实时更新').classes('text-xs text-slate-400')
+                        with ui.row().classes('w-full gap-4 flex-nowrap overflow-x-auto pb-2'):
+                            for idx, m in enumerate(data.trending):
+                                with ui.card().classes(
+                                        'w-36 flex-none p-0 gap-0 shadow-sm hover:shadow-md cursor-pointer rounded-lg overflow-hidden') \
+                                        .on('click', lambda _, mid=m.tconst: movie_detail.open_movie_detail_dialog(mid)):
+                                    with ui.column().classes(
+                                            f'w-full h-48 {BG_GRADIENTS[idx % len(BG_GRADIENTS)]} items-center justify-center relative'):
+                                        if m.poster_path:
+                                            ui.image(f"{IMAGE_BASE_URL}{m.poster_path}").classes('w-full h-full object-cover')
+                                        else:
+                                            ui.label(m.primaryTitle[:1].upper()).classes(
+                                                'text-5xl text-white opacity-30 font-black select-none')
+                                        ui.label(str(idx + 1)).classes(
+                                            'absolute top-1 left-1 bg-red-500 text-white text-xs font-bold px-2 rounded')
+                                    ui.label(m.primaryTitle).classes(
+                                        'text-xs font-bold text-slate-700 p-2 line-clamp-2 leading-snug')
+
                 # 3. 主内容区：左右分栏
                 with ui.row().classes('w-full items-start gap-10'):
 
@@ -279,14 +326,6 @@ def create_user_home():
                             ui.label(title_text).classes('text-2xl font-bold text-slate-800')
                             if not query: ui.label('数据来源: IMDb Datasets').classes('text-xs text-slate-400')
 
-                        # 调用 Service (传入 category)
-                        movies = await movie_service.get_homepage_movies(
-                            page=pagination['page'],  # <--- 使用状态里的 page
-                            page_size=pagination['page_size'],
-                            search_query=query,
-                            category=current_category['value']
-                        )
-
                         if not movies:
                             with ui.column().classes('w-full items-center py-20'):
                                 ui.icon('sentiment_dissatisfied', size='4em', color='grey-4')
@@ -386,14 +425,14 @@ def create_user_home():
                                     .props('flat color=slate-600 icon=chevron_left') \
                                     .bind_visibility_from(pagination, 'page', backward=lambda p: p > 1)
 
-                                ui.label(f"Page {pagination['page']} / {pagination['total_pages']}") \
+                                ui.label(f"Page {pagination['page']} / {total_label}") \
                                     .classes(
                                     'text-slate-500 font-mono text-sm bg-white px-4 py-1 rounded shadow-sm border')
 
                                 ui.button('下一页', on_click=lambda: change_page(1)) \
                                     .props('flat color=primary icon-right=chevron_right') \
-                                    .bind_visibility_from(pagination, 'page',
-                                                          backward=lambda p: p < pagination['total_pages'])
+                                    .bind_visibility_from(pagination, 'next_cursor',
+                                                          backward=lambda c: c is not None)
 
                     # === 右侧：侧边栏 ===
                     if is_login and not query:
@@ -457,27 +496,9 @@ def create_user_home():
 
                                 ui.separator()
 
-                                # 推荐策略：Spark -> 实时CF -> 热门
-                                data_source = await recommendation_service.get_spark_recommendations(
-                                    user_id, limit=8, category=cat_val
-                                )
-                                is_personalized = True
-
-                                # 2. 实时协同过滤 (带过滤)
-                                if not data_source:
-                                    data_source = await recommendation_service.get_recommendations(
-                                        user_id, limit=8, category=cat_val
-                                    )
-
-                                # 3. 兜底策略：如果个性化推荐在这个分类下没结果，就取该分类的“热门榜单”
-                                if not data_source:
-                                    is_personalized = False
-                                    # 我们需要 modify analysis_service 来支持 category，或者直接调用 movie_service 获取热门
-                                    # 最简单的方法：复用 movie_service.get_homepage_movies (它本身就是按热度排序的)
-                                    top_raw = await movie_service.get_homepage_movies(
-                                        page=1, page_size=8, category=cat_val
-                                    )
-                                    data_source = top_raw  # movie_service 返回的就是 MovieSummary 对象列表
+                                # 推荐策略：ALS、实时CF、热门并发取候选后混合 (blend_service，已随页面数据并发加载)
+                                data_source = data.sidebar
+                                is_personalized = data.is_personalized
 
                                 # --- UI 渲染逻辑 ---
                                 if is_personalized:
@@ -536,7 +557,7 @@ def create_user_home():
         # 切换分类时清空搜索框
         search_input.value = ''
         # 重新加载数据 (必须 await，否则会报错 coroutine never awaited)
-        pagination['page'] = 1
+        reset_pager()
         await load_movies()
 
     # 初始加载
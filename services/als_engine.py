@@ -0,0 +1,202 @@
+# services/als_engine.py
+"""
+进程内 ALS 矩阵分解 (纯 NumPy / SciPy，不依赖 JVM)
+
+单机部署时 spark_runner 的大部分时间花在启动 JVM、pandas -> Spark、Spark -> pandas 的来回复制上，
+真正的矩阵分解只有几百万条评分。这里用交替最小二乘直接在 CSR 稀疏矩阵上求解：
+- 显式反馈 (评分)：min Σ(r - u·v)² + λ(n_u‖u‖² + n_i‖v‖²)，正则项按互动数缩放，与 Spark ALS 一致
+- 隐式反馈 (Hu-Koren)：偏好 p = 1，置信度 c = 1 + α·r，min Σc(p - u·v)² + λ(‖u‖² + ‖v‖²)
+- 每一轮固定一侧因子，所有用户 (或电影) 的线性方程组一起用共轭梯度法求解：
+  A·x 不显式组装，只需 "每条互动一次点积 + 一次稀疏 × 稠密乘法"；以上一轮的因子为初值，每轮迭代 cg_steps 步即可
+- 稠密部分 (YᵀY、批量打分) 走 numpy 的 BLAS，自动多线程
+
+输入输出与 spark_runner 的 Spark 流程一致：(user_id, tconst, rating) 三元组 -> 用户 / 电影因子矩阵
+"""
+import time
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse as sp
+
+# 默认超参数 (与 spark_runner 中 Spark ALS 的配置一致)
+RANK = 4
+MAX_ITER = 15
+REG_PARAM = 0.5
+
+# 隐式反馈的置信度系数 (互动强度在 0~1 之间，收藏的置信度约为 1 + ALPHA)
+ALPHA = 10.0
+
+# 每轮共轭梯度的迭代步数 (rank 很小时 3 步基本已收敛)
+CG_STEPS = 3
+
+# 逐条互动点积时每块的条数 (控制峰值内存)
+CHUNK_SIZE = 1 << 20
+
+# 批量生成 Top-N 时每块的用户数
+BLOCK_SIZE = 2048
+
+# 训练结果：user_ids / item_ids 均已排序，与因子矩阵的行一一对应
+AlsFactors = namedtuple('AlsFactors', ['user_ids', 'user_factors', 'item_ids', 'item_factors'])
+
+
+def split(n, ratio=0.8, seed=42):
+    """随机划分训练集 / 测试集，返回训练集的布尔掩码"""
+    return np.random.default_rng(seed).random(n) < ratio
+
+
+def _row_dots(left, right, rows, cols):
+    """每条互动 (rows[k], cols[k]) 的点积 left[rows[k]] · right[cols[k]]，分块计算"""
+    out = np.empty(len(rows), dtype=left.dtype)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        out[start:end] = np.einsum('ij,ij->i', left[rows[start:end]], right[cols[start:end]])
+    return out
+
+
+class _Side:
+    """求解某一侧因子时用到的稀疏结构 (用户侧用 R，电影侧用 Rᵀ)"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.rows = np.repeat(np.arange(matrix.shape[0], dtype=np.int32), np.diff(matrix.indptr))
+        self.counts = np.diff(matrix.indptr).astype(np.float32)
+
+    def with_data(self, data):
+        """同一稀疏结构、换一组数值"""
+        return sp.csr_matrix((data, self.matrix.indices, self.matrix.indptr), shape=self.matrix.shape)
+
+
+def _solve(side, x, y, reg_param, implicit, alpha, cg_steps, nonnegative):
+    """
+    固定 y，更新 x 的每一行 (原地)
+    显式: (Σ yᵢyᵢᵀ + λn I) x = Σ rᵢ yᵢ
+    隐式: (YᵀY + Σ α rᵢ yᵢyᵢᵀ + λ I) x = Σ (1 + α rᵢ) yᵢ
+    """
+    data = side.matrix.data
+    indices = side.matrix.indices
+    if implicit:
+        weights = alpha * data
+        b = side.with_data(1.0 + weights) @ y
+        gram = y.T @ y
+        reg = np.float32(reg_param)
+    else:
+        weights = None
+        b = side.matrix @ y
+        gram = None
+        reg = (reg_param * side.counts)[:, None]
+
+    def matvec(p):
+        dots = _row_dots(p, y, side.rows, indices)
+        if weights is not None:
+            dots *= weights
+        result = side.with_data(dots) @ y + reg * p
+        if gram is not None:
+            result += p @ gram
+        return result
+
+    # 批量共轭梯度：每一行是独立的方程组，步长按行计算
+    r = b - matvec(x)
+    p = r.copy()
+    rs_old = np.einsum('ij,ij->i', r, r)
+    for _ in range(cg_steps):
+        if not rs_old.any():
+            break
+        ap = matvec(p)
+        denom = np.einsum('ij,ij->i', p, ap)
+        step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+        x += step[:, None] * p
+        r -= step[:, None] * ap
+        rs_new = np.einsum('ij,ij->i', r, r)
+        beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+        p = r + beta[:, None] * p
+        rs_old = rs_new
+
+    if nonnegative:
+        # 投影到非负区域 (近似 Spark 的 NNLS 约束)
+        np.maximum(x, 0, out=x)
+
+
+def train(user_ids, tconsts, values, rank=RANK, max_iter=MAX_ITER, reg_param=REG_PARAM, implicit=False,
+          alpha=ALPHA, nonnegative=False, cg_steps=CG_STEPS, seed=42, log=None):
+    """
+    训练 ALS
+    :param values: 显式模式下是评分；隐式模式下是互动强度 (收藏/评分的权重，决定置信度)
+    :param nonnegative: 每轮求解后把因子截断到非负 (对应 Spark 的 nonnegative=True)
+    :param log: 可选的日志函数，每轮输出一次耗时
+    :return: AlsFactors
+    """
+    users, user_idx = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    items, item_idx = np.unique(np.asarray(tconsts).astype(str), return_inverse=True)
+    ratings = sp.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (user_idx, item_idx)), shape=(len(users), len(items))
+    )
+    ratings.sum_duplicates()
+    user_side = _Side(ratings)
+    item_side = _Side(ratings.T.tocsr())
+
+    rng = np.random.default_rng(seed)
+    user_factors = np.zeros((len(users), rank), dtype=np.float32)
+    item_factors = (rng.standard_normal((len(items), rank)) / np.sqrt(rank)).astype(np.float32)
+    if nonnegative:
+        np.abs(item_factors, out=item_factors)
+
+    for iteration in range(max_iter):
+        start = time.perf_counter()
+        _solve(user_side, user_factors, item_factors, reg_param, implicit, alpha, cg_steps, nonnegative)
+        _solve(item_side, item_factors, user_factors, reg_param, implicit, alpha, cg_steps, nonnegative)
+        if log:
+            log(f"   ALS 第 {iteration + 1}/{max_iter} 轮，耗时 {time.perf_counter() - start:.2f}s")
+
+    return AlsFactors(users, user_factors, items, item_factors)
+
+
+def predict(factors, user_ids, tconsts):
+    """
+    预测评分
+    :return: (预测值数组, 布尔掩码)；用户或电影不在模型里的记录掩码为 False (对应 Spark 的 coldStartStrategy="drop")
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    tconsts = np.asarray(tconsts).astype(str)
+    rows = np.minimum(np.searchsorted(factors.user_ids, user_ids), max(len(factors.user_ids) - 1, 0))
+    cols = np.minimum(np.searchsorted(factors.item_ids, tconsts), max(len(factors.item_ids) - 1, 0))
+    known = np.zeros(len(user_ids), dtype=bool)
+    if len(factors.user_ids) and len(factors.item_ids):
+        known = (factors.user_ids[rows] == user_ids) & (factors.item_ids[cols] == tconsts)
+    predictions = np.zeros(len(user_ids), dtype=np.float32)
+    predictions[known] = _row_dots(factors.user_factors, factors.item_factors, rows[known], cols[known])
+    return predictions, known
+
+
+def rmse(factors, user_ids, tconsts, values):
+    """测试集 RMSE (只统计模型中已有的用户和电影)；没有可评估的记录时返回 nan"""
+    predictions, known = predict(factors, user_ids, tconsts)
+    if not known.any():
+        return float('nan')
+    errors = predictions[known] - np.asarray(values, dtype=np.float32)[known]
+    return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def recommend_all(factors, n=10, block_size=BLOCK_SIZE):
+    """
+    为所有用户生成 Top-N (分块矩阵乘法 + argpartition，与 Spark recommendForAllUsers 相同，不屏蔽已看)
+    :return: (user_id 数组, tconst 数组, 分数数组)，每个用户 n 行
+    """
+    n = min(n, len(factors.item_ids))
+    if n <= 0 or not len(factors.user_ids):
+        return factors.user_ids[:0], factors.item_ids[:0], np.zeros(0, dtype=np.float32)
+
+    top_items, top_scores = [], []
+    for start in range(0, len(factors.user_ids), block_size):
+        scores = factors.user_factors[start:start + block_size] @ factors.item_factors.T
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        top_values = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_values, axis=1, kind='stable')
+        top_items.append(np.take_along_axis(top, order, axis=1))
+        top_scores.append(np.take_along_axis(top_values, order, axis=1))
+
+    items = np.vstack(top_items)
+    return (
+        np.repeat(factors.user_ids, n),
+        factors.item_ids[items.ravel()],
+        np.vstack(top_scores).ravel(),
+    )
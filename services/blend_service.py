@@ -0,0 +1,122 @@
+# services/blend_service.py
+"""
+混合推荐 (侧边栏)
+
+原来的侧边栏是 Spark -> 实时CF -> 热门 的顺序降级链：前一个来源返回空才去问下一个，
+最坏情况下延迟是三个来源之和，而且每个来源各自查库、各自按分类过滤。
+现在所有来源并发取候选 (tconst, 分数)：
+- 每个来源有独立的超时，超时或出错只当作该来源没有结果，不影响其它来源
+- 各来源的分数量纲不同 (预测评分 / 相似度加权和 / 热度名次)，先各自 min-max 归一化到 [0, 1]
+- 按 SOURCE_WEIGHTS 加权求和，同一部电影出现在多个来源时分数累加 (天然按 tconst 去重)
+- 个性化来源的候选整体排在前面，只来自热门的电影排在所有个性化候选之后，只填补剩下的位置
+- 热门来源直接复用内存热门池里的 PopularMovie (已按分类筛好，可直接渲染)，
+  只有模型来源 (ALS / 实时CF) 的电影才需要一次按主键取详情，分类过滤只在这一次查询里做
+"""
+import asyncio
+
+from services import movie_service, recommendation_service
+
+# 各来源的权重：决定同一层内的先后 (个性化来源之间互相比较；热门同时出现在个性化候选里时给一点加分)
+# 分层见 blend()：只来自热门的电影无论分数多高都排在个性化候选之后
+SOURCE_WEIGHTS = {
+    'als': 1.0,
+    'item_cf': 1.0,
+    'popular': 0.2,
+}
+
+# 各来源的超时 (秒)：内存打分很快，主要是防止数据库慢查询拖住整个侧边栏
+SOURCE_TIMEOUTS = {
+    'als': 0.5,
+    'item_cf': 0.8,
+    'popular': 0.3,
+}
+
+# 会让侧边栏显示为 "个性化推荐" 的来源
+PERSONALIZED_SOURCES = {'als', 'item_cf'}
+
+# 每个来源取的候选数 (分类过滤后还要够 limit 条)
+CANDIDATES_PER_SOURCE = 100
+
+
+async def _popular_candidates(category, n, rows):
+    """
+    热门候选：内存热门池 (池还没建好时才查库)，分数按名次递减
+    :param rows: 输出参数，写入 {tconst: 可直接渲染的电影}，合并后不必再为这些电影查库
+    """
+    movies = movie_service.get_popular_movies(category, n)
+    if not movies:
+        movies = await movie_service.get_homepage_movies(page=1, page_size=n, category=category)
+    rows.update((m.tconst, m) for m in movies)
+    return [(m.tconst, float(len(movies) - i)) for i, m in enumerate(movies)]
+
+
+def _sources(user_id, category, n, rows):
+    return {
+        'als': recommendation_service.get_als_candidates(user_id, n=n, category=category),
+        'item_cf': recommendation_service.get_item_cf_candidates(user_id, n=n),
+        'popular': _popular_candidates(category, n, rows),
+    }
+
+
+async def _fetch(name, coro, timeout):
+    """取一个来源的候选；超时或出错返回空列表"""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ [Blend] 推荐来源 {name} 超时 ({timeout}s)，本次跳过")
+    except Exception as e:
+        print(f"⚠️ [Blend] 推荐来源 {name} 出错: {e}")
+    return []
+
+
+def _normalize(candidates):
+    """min-max 归一化到 [0, 1]；只有一个候选或分数全相同时都记 1"""
+    if not candidates:
+        return {}
+    scores = [s for _, s in candidates]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return {t: (s - low) / span if span > 0 else 1.0 for t, s in candidates}
+
+
+def blend(candidates_by_source, weights=None):
+    """
+    合并多个来源的候选：有个性化来源的电影在前，只来自热门等兜底来源的在后，每层内按混合分数降序
+    :param candidates_by_source: {来源: [(tconst, 分数)]}
+    :return: ([tconst]，按上述顺序, {tconst: 贡献了分数的来源集合})
+    """
+    weights = weights or SOURCE_WEIGHTS
+    blended, sources_of = {}, {}
+    for name, candidates in candidates_by_source.items():
+        weight = weights.get(name, 0.0)
+        if weight <= 0:
+            continue
+        for tconst, score in _normalize(candidates).items():
+            blended[tconst] = blended.get(tconst, 0.0) + weight * score
+            sources_of.setdefault(tconst, set()).add(name)
+    ranked = sorted(blended, key=lambda t: (not sources_of[t] & PERSONALIZED_SOURCES, -blended[t], t))
+    return ranked, sources_of
+
+
+async def get_blended_recommendations(user_id, category='all', limit=8, weights=None):
+    """
+    侧边栏推荐：所有来源并发取候选 -> 归一化加权合并 -> 只为热门池以外的电影取详情 (按分类过滤)
+    :return: (电影列表 (MovieSummary / 热门池的 PopularMovie), 是否个性化)
+    """
+    rows = {}  # tconst -> 已有的可渲染电影 (热门来源)
+    names, coros = zip(*_sources(user_id, category, CANDIDATES_PER_SOURCE, rows).items())
+    results = await asyncio.gather(*(
+        _fetch(name, coro, SOURCE_TIMEOUTS.get(name, 1.0)) for name, coro in zip(names, coros)
+    ))
+
+    ranked, sources_of = blend(dict(zip(names, results)), weights)
+    # 只保留真正参与了合并的热门电影 (来源出错或权重为 0 时不算)
+    rows = {t: m for t, m in rows.items() if t in sources_of}
+    missing = [t for t in ranked if t not in rows]
+    rows.update((m.tconst, m) for m in await movie_service.get_summaries_by_ids(missing, category=category))
+
+    movies = [rows[t] for t in ranked if t in rows][:limit]
+    # 大半来自个性化来源才算个性化推荐；只有零星几条、其余都是热门补位时仍按热门榜单展示
+    personalized = sum(1 for m in movies if sources_of[m.tconst] & PERSONALIZED_SOURCES)
+    is_personalized = personalized * 2 > len(movies)
+    return movies, is_personalized
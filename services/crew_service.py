@@ -1,6 +1,7 @@
-from sqlalchemy import select, func, update, delete, or_
+from sqlalchemy import select, func, update, delete
 from database import AsyncSessionLocal
 from models import TitleCrew, TitleBasics
+from services import search_service
 
 
 # 修改计数函数，接收搜索关键词
@@ -14,10 +15,7 @@ async def get_crew_count(search_query=None):
             # 注意：因为要搜“电影名”，所以必须 join TitleBasics 表
             query = query.join(TitleBasics, TitleCrew.tconst == TitleBasics.tconst)
             query = query.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),  # 搜电影名
-                    TitleCrew.tconst.ilike(f"%{search_query}%")  # 搜编号
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleCrew.tconst])
             )
 
         result = await db.execute(query)
@@ -42,14 +40,12 @@ async def get_crew_paginated(page: int, page_size: int, search_query=None):
         # 如果有搜索内容，添加过滤条件
         if search_query:
             stmt = stmt.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),  # 搜电影名
-                    TitleCrew.tconst.ilike(f"%{search_query}%")  # 搜编号
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleCrew.tconst])
             )
 
-        # 排序、分页
-        stmt = stmt.order_by(TitleCrew.tconst).offset(offset).limit(page_size)
+        # 排序、分页 (搜索标题时相关度高的排前面)
+        stmt = search_service.order_by_rank(stmt, search_query, TitleBasics.primaryTitle, TitleCrew.tconst)
+        stmt = stmt.offset(offset).limit(page_size)
 
         result = await db.execute(stmt)
         return result.all()
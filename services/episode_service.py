@@ -1,6 +1,7 @@
-from sqlalchemy import select, func, update, delete, or_
+from sqlalchemy import select, func, update, delete
 from database import AsyncSessionLocal
 from models import TitleEpisode, TitleBasics
+from services import search_service
 
 
 async def get_episode_count(search_query=None):
@@ -12,13 +13,10 @@ async def get_episode_count(search_query=None):
         if search_query:
             # 必须联表才能搜到 parentTitle (使用左外连接防止数据丢失)
             query = query.join(TitleBasics, TitleEpisode.parentTconst == TitleBasics.tconst, isouter=True)
-            query = query.where(
-                or_(
-                    TitleEpisode.tconst.ilike(f"%{search_query}%"),  # 搜本集编号
-                    TitleEpisode.parentTconst.ilike(f"%{search_query}%"),  # 搜父级编号
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%")  # 搜父级剧集名
-                )
-            )
+            # 搜本集编号 / 父级编号 / 父级剧集名
+            query = query.where(search_service.search_filter(
+                search_query, TitleBasics.primaryTitle, [TitleEpisode.tconst, TitleEpisode.parentTconst]
+            ))
 
         result = await db.execute(query)
         return result.scalar()
@@ -39,16 +37,13 @@ async def get_episodes_paginated(page: int, page_size: int, search_query=None):
 
         # 如果有搜索内容，添加过滤条件
         if search_query:
-            stmt = stmt.where(
-                or_(
-                    TitleEpisode.tconst.ilike(f"%{search_query}%"),  # 搜本集编号
-                    TitleEpisode.parentTconst.ilike(f"%{search_query}%"),  # 搜父级编号
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%")  # 搜父级剧集名
-                )
-            )
+            stmt = stmt.where(search_service.search_filter(
+                search_query, TitleBasics.primaryTitle, [TitleEpisode.tconst, TitleEpisode.parentTconst]
+            ))
 
-        # 排序与分页
-        stmt = stmt.order_by(TitleEpisode.tconst).offset(offset).limit(page_size)
+        # 排序与分页 (搜索剧集名时相关度高的排前面)
+        stmt = search_service.order_by_rank(stmt, search_query, TitleBasics.primaryTitle, TitleEpisode.tconst)
+        stmt = stmt.offset(offset).limit(page_size)
 
         result = await db.execute(stmt)
         return result.all()
@@ -0,0 +1,90 @@
+# services/evaluation.py
+"""
+推荐效果的离线评估工具 (纯 NumPy)
+
+- holdout_split: 每个用户留出最后 k 条互动 (按时间) 或随机 k 条作测试集，其余作训练集
+- ranking_metrics: 单个用户的 precision@k / recall@k / NDCG@k (二值相关性)
+- summarize: 汇总所有用户的平均指标、覆盖率和延迟分位数
+
+bench/eval_recommenders.py 用它对比 ALS、Item-CF、热门兜底三种推荐
+"""
+import numpy as np
+
+# 每个用户留出的测试互动数
+HOLDOUT_K = 5
+
+# 留出后训练集里至少还要剩下这么多条，否则该用户不参与评估
+MIN_TRAIN = 3
+
+# 测试集中评分达到这个值 (收藏记 10 分) 才算 "相关"
+RELEVANT_MIN = 6.0
+
+# 评估的推荐列表长度
+TOP_K = 10
+
+
+def holdout_split(user_ids, timestamps=None, k=HOLDOUT_K, mode='time', min_train=MIN_TRAIN, seed=42):
+    """
+    按用户留出测试集
+    :param timestamps: 互动时间 (数值，越大越新)；mode='time' 时留出每个用户最新的 k 条
+    :param mode: 'time' 按时间留出；'random' 随机留出 k 条 (leave-k-out)
+    :return: 布尔掩码，True 表示该条互动属于测试集
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    if mode == 'time':
+        key = np.asarray(timestamps, dtype=np.float64)
+    elif mode == 'random':
+        key = np.random.default_rng(seed).random(len(user_ids))
+    else:
+        raise ValueError(f"未知的划分方式: {mode}")
+
+    order = np.lexsort((key, user_ids))
+    _, inverse, counts = np.unique(user_ids[order], return_inverse=True, return_counts=True)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    from_end = counts[inverse] - 1 - (np.arange(len(order)) - starts[inverse])
+
+    mask = np.zeros(len(user_ids), dtype=bool)
+    mask[order] = (from_end < k) & (counts[inverse] >= k + min_train)
+    return mask
+
+
+def ranking_metrics(recommended, relevant, k=TOP_K):
+    """
+    :param recommended: 推荐列表 (已按分数降序)
+    :param relevant: 测试集中的相关电影 (集合)
+    :return: (precision@k, recall@k, NDCG@k)
+    """
+    if not relevant:
+        return 0.0, 0.0, 0.0
+    hits = np.array([tconst in relevant for tconst in list(recommended)[:k]], dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float((hits * discounts[:len(hits)]).sum())
+    idcg = float(discounts[:min(len(relevant), k)].sum())
+    return float(hits.sum()) / k, float(hits.sum()) / len(relevant), dcg / idcg
+
+
+def summarize(rows, recommended_items, catalog_size):
+    """
+    :param rows: [(precision, recall, ndcg, 延迟 ms, 推荐条数)]，每个用户一行
+    :param recommended_items: 所有用户推荐过的电影集合
+    :param catalog_size: 可推荐的电影总数 (覆盖率的分母)
+    :return: 可 JSON 序列化的汇总 dict
+    """
+    if not rows:
+        return {"users": 0}
+    data = np.asarray(rows, dtype=np.float64)
+    latency = data[:, 3]
+    return {
+        "users": len(rows),
+        "users_with_recs": int((data[:, 4] > 0).sum()),
+        "precision": round(float(data[:, 0].mean()), 6),
+        "recall": round(float(data[:, 1].mean()), 6),
+        "ndcg": round(float(data[:, 2].mean()), 6),
+        "coverage": round(len(recommended_items) / catalog_size, 6) if catalog_size else 0.0,
+        "latency_ms": {
+            "mean": round(float(latency.mean()), 4),
+            "p50": round(float(np.percentile(latency, 50)), 4),
+            "p95": round(float(np.percentile(latency, 95)), 4),
+            "p99": round(float(np.percentile(latency, 99)), 4),
+        },
+    }
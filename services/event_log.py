@@ -0,0 +1,59 @@
+# services/event_log.py
+"""
+用户互动事件流水 (user_interaction_events) 的读取接口
+
+interaction_service 在修改评分/收藏的同一条 SQL 里追加事件 (见 interaction_service)，
+事件只追加不修改，seq 单调递增。下游 (推荐模型增量更新、热门趋势、离线训练) 记住自己处理到的 seq，
+下次只按主键区间 seq > 上次位置 读取新事件，不必再扫描整张状态表。
+"""
+from sqlalchemy import select, func
+
+from database import AsyncSessionLocal
+from models import UserInteractionEvent
+
+# 事件类型
+EVENT_RATE = 'rate'  # 新增或修改评分 (value = 分数)
+EVENT_UNRATE = 'unrate'  # 删除评分
+EVENT_FAVORITE = 'favorite'  # 收藏
+EVENT_UNFAVORITE = 'unfavorite'  # 取消收藏
+
+# 单次读取的默认条数
+DEFAULT_BATCH_SIZE = 10000
+
+
+async def get_latest_seq(db=None):
+    """当前最大的事件序号，没有事件时为 0"""
+    stmt = select(func.coalesce(func.max(UserInteractionEvent.seq), 0))
+    if db is not None:
+        return (await db.execute(stmt)).scalar()
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(stmt)).scalar()
+
+
+async def get_events_after(after_seq=0, limit=DEFAULT_BATCH_SIZE, upto_seq=None):
+    """
+    按 seq 顺序读取 after_seq 之后的事件 (主键范围扫描)
+    :param upto_seq: 只读到这个序号 (含)，用于固定一个批次的上界
+    :return: 事件列表；返回条数等于 limit 时说明可能还有更多，用最后一条的 seq 继续读
+    """
+    stmt = select(UserInteractionEvent).where(UserInteractionEvent.seq > after_seq)
+    if upto_seq is not None:
+        stmt = stmt.where(UserInteractionEvent.seq <= upto_seq)
+    stmt = stmt.order_by(UserInteractionEvent.seq).limit(limit)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+
+async def get_changed_users(after_seq, upto_seq, db=None):
+    """(after_seq, upto_seq] 区间内产生过事件的用户 ID 列表 (含删除评分/取消收藏)"""
+    stmt = (
+        select(UserInteractionEvent.user_id)
+        .where(UserInteractionEvent.seq > after_seq, UserInteractionEvent.seq <= upto_seq)
+        .distinct()
+    )
+    if db is not None:
+        return (await db.execute(stmt)).scalars().all()
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(stmt)).scalars().all()
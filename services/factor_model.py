@@ -0,0 +1,178 @@
+# services/factor_model.py
+"""
+ALS 隐因子模型 (Spark 离线训练，Web 端在线打分)
+
+spark_runner.py 原来只把 recommendForAllUsers(10) 写进 spark_recommendations 表，
+前台再按分类过滤，动漫/纪录片这类小分类经常一条都剩不下。
+现在训练完把因子矩阵导出为 model_store 版本 (mmap)：
+- user_ids / user_factors: 用户编号 (升序) 与用户因子 [用户 × rank]
+- item_ids / item_factors: tconst (字典序) 与电影因子 [电影 × rank]
+- item_masks: 每部电影的 category_mask (与 movie_summary 一致)，用于分类屏蔽
+- seen_indptr / seen_indices: 训练数据中每个用户已互动的电影 (CSR 结构)，用于已看屏蔽
+Web 端一次矩阵 × 向量点积打分 (限定分类时只算该分类的因子子矩阵)，屏蔽已看后 argpartition，任意分类、任意 N 都能现算
+
+本模块只依赖 numpy 和 model_store，spark_runner 可以直接导入
+"""
+from datetime import datetime
+
+import numpy as np
+
+from services import model_store
+
+# 模型在 data/models/ 下的目录名
+MODEL_NAME = "als"
+
+
+class FactorModel:
+    """训练好的 ALS 因子 (只读)"""
+
+    def __init__(self, user_ids, user_factors, item_ids, item_factors, item_masks, seen_indptr, seen_indices,
+                 meta=None):
+        self.user_ids = user_ids
+        self.user_factors = user_factors
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+        self.item_masks = item_masks
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+        self.meta = dict(meta or {})
+        self.version = self.meta.get("version")
+        self.built_at = datetime.fromisoformat(self.meta["built_at"]) if "built_at" in self.meta else datetime.now()
+        self._category_views = {}  # 分类位 -> (该分类的电影行号, 对应的因子子矩阵)，按需生成后缓存
+
+    @property
+    def user_count(self):
+        return len(self.user_ids)
+
+    @property
+    def item_count(self):
+        return len(self.item_ids)
+
+    @property
+    def rank(self):
+        return self.item_factors.shape[1] if self.item_factors.ndim == 2 else 0
+
+    def user_index(self, user_id):
+        """user_id -> 行号，不在模型里返回 -1"""
+        if self.user_count == 0:
+            return -1
+        pos = int(np.searchsorted(self.user_ids, user_id))
+        return pos if pos < self.user_count and self.user_ids[pos] == user_id else -1
+
+    def _category_view(self, category_bit):
+        """
+        某个分类的电影行号和连续存放的因子子矩阵
+        小分类只需对子矩阵做点积，比全量打分再屏蔽快得多 (子矩阵是进程内副本，总量不超过一份因子矩阵多一点)
+        """
+        view = self._category_views.get(category_bit)
+        if view is None:
+            idx = np.flatnonzero((self.item_masks & category_bit) != 0)
+            view = (idx, np.ascontiguousarray(self.item_factors[idx]))
+            self._category_views[category_bit] = view
+        return view
+
+    def recommend(self, user_id, n=100, category_bit=None):
+        """
+        给单个用户打分
+        :param category_bit: movie_service.CATEGORY_BITS 中的分类位，None 表示不限分类
+        :return: (电影行号数组, 分数数组)，按分数降序，最多 n 个；不在模型中的用户返回空
+        """
+        row = self.user_index(user_id)
+        if row < 0 or n <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        seen = self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]
+        user_vector = self.user_factors[row]
+
+        # 一次矩阵 × 向量点积得到候选电影的预测分 (限定分类时只算该分类的子矩阵)，再屏蔽已看
+        if category_bit:
+            candidates, factors = self._category_view(category_bit)
+            scores = factors @ user_vector
+            pos = np.minimum(np.searchsorted(candidates, seen), max(len(candidates) - 1, 0))
+            if len(candidates):
+                scores[pos[candidates[pos] == seen]] = -np.inf
+        else:
+            candidates = None
+            scores = self.item_factors @ user_vector
+            scores[seen] = -np.inf
+
+        # argpartition 取 Top-N，再对这 N 个排序，去掉被屏蔽的
+        if len(scores) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[np.isfinite(scores[top])]
+        items = top if candidates is None else candidates[top]
+        return items.astype(np.int64), scores[top]
+
+    def to_arrays(self):
+        return {
+            "user_ids": self.user_ids,
+            "user_factors": self.user_factors,
+            "item_ids": self.item_ids,
+            "item_factors": self.item_factors,
+            "item_masks": self.item_masks,
+            "seen_indptr": self.seen_indptr,
+            "seen_indices": self.seen_indices,
+        }
+
+    def save(self, version_meta=None):
+        """写入一个新的模型版本，返回版本号"""
+        meta = {k: v for k, v in self.meta.items() if k not in ("version", "format", "arrays", "created_at")}
+        meta.update({
+            "built_at": self.built_at.isoformat(),
+            "user_count": self.user_count,
+            "item_count": self.item_count,
+            "rank": self.rank,
+        })
+        meta.update(version_meta or {})
+        return model_store.write_artifact(MODEL_NAME, self.to_arrays(), meta)
+
+    @classmethod
+    def load(cls, version=None):
+        """mmap 方式加载 (默认 CURRENT 版本)；没有模型时返回 None"""
+        arrays, meta = model_store.read_artifact(MODEL_NAME, version)
+        if arrays is None:
+            return None
+        return cls(meta=meta, **arrays)
+
+
+def from_factors(user_ids, user_factors, item_ids, item_factors, seen_user_ids, seen_tconsts, item_masks=None,
+                 meta=None):
+    """
+    由 (任意顺序的) 因子和训练互动组装模型：用户按编号、电影按 tconst 排序，已看关系转成 CSR 结构
+    :param item_masks: 与 item_ids 对齐的 category_mask，缺失为 0
+    :param seen_user_ids / seen_tconsts: 训练用的互动 (用于已看屏蔽)，不在因子里的用户/电影会被忽略
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    item_ids = np.asarray(item_ids).astype(str)
+    user_order = np.argsort(user_ids, kind='stable')
+    item_order = np.argsort(item_ids, kind='stable')
+    user_ids, item_ids = user_ids[user_order], item_ids[item_order]
+
+    user_factors = np.ascontiguousarray(np.asarray(user_factors, dtype=np.float32)[user_order])
+    item_factors = np.ascontiguousarray(np.asarray(item_factors, dtype=np.float32)[item_order])
+    if item_masks is None:
+        item_masks = np.zeros(len(item_ids), dtype=np.int32)
+    else:
+        item_masks = np.asarray(item_masks, dtype=np.int32)[item_order]
+
+    # 已看关系：映射到行号/列号，去重后按行排好
+    seen_users = np.asarray(seen_user_ids, dtype=np.int64)
+    seen_items = np.asarray(seen_tconsts).astype(str)
+    rows = np.searchsorted(user_ids, seen_users) if len(user_ids) else np.zeros(0, dtype=np.int64)
+    cols = np.searchsorted(item_ids, seen_items) if len(item_ids) else np.zeros(0, dtype=np.int64)
+    rows = np.minimum(rows, max(len(user_ids) - 1, 0))
+    cols = np.minimum(cols, max(len(item_ids) - 1, 0))
+    valid = np.zeros(len(seen_users), dtype=bool)
+    if len(user_ids) and len(item_ids):
+        valid = (user_ids[rows] == seen_users) & (item_ids[cols] == seen_items)
+    pairs = np.unique(rows[valid] * max(len(item_ids), 1) + cols[valid])
+    seen_rows = pairs // max(len(item_ids), 1)
+    seen_indices = (pairs % max(len(item_ids), 1)).astype(np.int32)
+    seen_indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(seen_rows, minlength=len(user_ids)), out=seen_indptr[1:])
+
+    return FactorModel(user_ids, user_factors, item_ids, item_factors, item_masks, seen_indptr, seen_indices,
+                       meta={**(meta or {}), "built_at": datetime.now().isoformat()})
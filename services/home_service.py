@@ -0,0 +1,86 @@
+# services/home_service.py
+"""
+首页数据加载 (一次渲染一个工作单元)
+
+原来 load_movies() 依次调用 收藏 -> 评分 -> 计数 -> 列表 -> Spark -> 实时CF -> 热门，
+每一步都要等上一步的数据库往返结束，首屏时间是所有查询之和。
+现在把互不依赖的部分用 asyncio.gather 并发执行，每个分支从连接池拿各自的连接：
+- 当前页电影列表 + 这些电影的收藏/评分状态 (后者依赖列表结果，在同一个分支里紧接着查)
+- 分页计数
+- 侧边栏推荐 (blend_service：ALS / 实时CF / 热门 并发取候选后加权合并)
+- 实时热门 (热度在内存里，只按主键取这几部电影的详情)
+首屏时间约等于最慢的那个分支
+"""
+import asyncio
+from collections import namedtuple
+
+from services import blend_service, interaction_service, movie_service, trending_service
+
+# 侧边栏推荐条数
+SIDEBAR_LIMIT = 8
+
+# "正在流行" 一行的条数
+TRENDING_LIMIT = 10
+
+HomeData = namedtuple('HomeData', [
+    'movies',  # 当前页 MovieSummary 列表
+    'next_cursor',  # 下一页游标，没有下一页为 None
+    'total_count',  # 分页计数 (搜索时为封顶计数)
+    'favorite_ids',  # 当前页中用户已收藏的 tconst 集合
+    'ratings',  # 当前页中用户的评分 {tconst: 评分}
+    'sidebar',  # 侧边栏推荐列表，不显示侧边栏时为 None
+    'is_personalized',  # 侧边栏是否是个性化推荐 (否则是热门榜单)
+    'trending',  # 当前分类的实时热门 MovieSummary 列表，不显示时为空列表
+])
+
+
+async def get_sidebar_recommendations(user_id, category='all', limit=SIDEBAR_LIMIT):
+    """
+    侧边栏推荐：ALS、实时CF、热门 三个来源并发取候选，归一化后加权合并 (见 blend_service)
+    :return: (推荐列表, 是否个性化)
+    """
+    return await blend_service.get_blended_recommendations(user_id, category=category, limit=limit)
+
+
+async def _load_page(user_id, search_query, category, page_size, after):
+    """当前页电影 + 这些电影的收藏/评分状态"""
+    movies, next_cursor = await movie_service.get_homepage_movies_after(
+        page_size=page_size, search_query=search_query, category=category, after=after
+    )
+    favorite_ids, ratings = set(), {}
+    if user_id and movies:
+        favorite_ids, ratings = await interaction_service.get_interaction_state(user_id, [m.tconst for m in movies])
+    return movies, next_cursor, favorite_ids, ratings
+
+
+async def _no_sidebar():
+    return None, False
+
+
+async def get_trending_movies(category='all', limit=TRENDING_LIMIT):
+    """当前分类的实时热门 (按热度排序的 MovieSummary 列表)"""
+    trending = trending_service.get_trending(category, limit)
+    return await movie_service.get_summaries_by_ids([tconst for tconst, _ in trending])
+
+
+async def _no_trending():
+    return []
+
+
+async def load_home_data(user_id=None, search_query=None, category='all', page_size=24, after=None,
+                         with_sidebar=False, with_trending=False):
+    """
+    并发加载首页一次渲染需要的全部数据
+    :param user_id: 未登录传 None (不查收藏/评分)
+    :param after: 游标分页的起点 (见 movie_service.get_homepage_movies_after)
+    :param with_sidebar: 是否需要侧边栏推荐
+    :param with_trending: 是否需要 "正在流行" 一行
+    """
+    page, total_count, (sidebar, is_personalized), trending = await asyncio.gather(
+        _load_page(user_id, search_query, category, page_size, after),
+        movie_service.get_homepage_movie_count(search_query=search_query, category=category),
+        get_sidebar_recommendations(user_id, category) if with_sidebar and user_id else _no_sidebar(),
+        get_trending_movies(category) if with_trending else _no_trending(),
+    )
+    movies, next_cursor, favorite_ids, ratings = page
+    return HomeData(movies, next_cursor, total_count, favorite_ids, ratings, sidebar, is_personalized, trending)
@@ -1,6 +1,11 @@
-from sqlalchemy import select, delete, and_, desc, func
+from datetime import datetime
+
+from sqlalchemy import select, func, desc, null, true, false, union_all, text
+from sqlalchemy.exc import ProgrammingError
 from database import AsyncSessionLocal
 from models import UserFavorite, MovieSummary, UserRating
+from services import recommendation_cache, trending_service
+from services.event_log import EVENT_RATE, EVENT_UNRATE, EVENT_FAVORITE, EVENT_UNFAVORITE
 
 
 
@@ -17,32 +22,77 @@ async def get_my_ratings_count(user_id: int):
         return result.scalar()
 
 # --- 增/删 (Toggle) ---
+# 所有写入都是单条语句：修改状态表的同时往 user_interaction_events 追加一条事件 (同一事务，不会漏记)
+
+# 能删掉就是取消收藏，删不到就插入
+# 并发双击时另一个请求可能抢先插入，ON CONFLICT DO NOTHING 兜底，此时结果同样是"已收藏" (状态没变，不记事件)
+_TOGGLE_FAVORITE_SQL = text(f"""
+    WITH removed AS (
+        DELETE FROM user_favorites
+        WHERE user_id = :user_id AND tconst = :tconst
+        RETURNING user_id, tconst
+    ), added AS (
+        INSERT INTO user_favorites (user_id, tconst, created_at)
+        SELECT CAST(:user_id AS INTEGER), CAST(:tconst AS VARCHAR), CAST(:created_at AS TIMESTAMP)
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, tconst) DO NOTHING
+        RETURNING user_id, tconst
+    ), logged AS (
+        INSERT INTO user_interaction_events (user_id, tconst, event_type, created_at)
+        SELECT user_id, tconst, '{EVENT_UNFAVORITE}', CAST(:created_at AS TIMESTAMP) FROM removed
+        UNION ALL
+        SELECT user_id, tconst, '{EVENT_FAVORITE}', CAST(:created_at AS TIMESTAMP) FROM added
+    )
+    SELECT NOT EXISTS (SELECT 1 FROM removed),
+           EXISTS (SELECT 1 FROM added),
+           (SELECT category_mask FROM movie_summary WHERE tconst = :tconst)
+""")
+
+# 新增或修改评分 (依赖 uix_user_rating 唯一约束)
+# ON CONFLICT 的 UPDATE 不会触发 ORM 的 onupdate，updated_at 需要显式写入
+# xmax = 0 说明这一行是新插入的 (走了 UPDATE 分支的行 xmax 是当前事务号)，用来区分首次评分和改分
+_UPSERT_RATING_SQL = text(f"""
+    WITH upserted AS (
+        INSERT INTO user_personal_ratings (user_id, tconst, rating, created_at, updated_at)
+        VALUES (:user_id, :tconst, :rating, :now, :now)
+        ON CONFLICT ON CONSTRAINT uix_user_rating
+        DO UPDATE SET rating = EXCLUDED.rating, updated_at = EXCLUDED.updated_at
+        RETURNING user_id, tconst, rating, (xmax = 0) AS inserted
+    )
+    INSERT INTO user_interaction_events (user_id, tconst, event_type, value, created_at)
+    SELECT user_id, tconst, '{EVENT_RATE}', rating, CAST(:now AS TIMESTAMP) FROM upserted
+    RETURNING (SELECT inserted FROM upserted),
+              (SELECT category_mask FROM movie_summary WHERE tconst = :tconst)
+""")
+
+_DELETE_RATING_SQL = text(f"""
+    WITH removed AS (
+        DELETE FROM user_personal_ratings
+        WHERE user_id = :user_id AND tconst = :tconst
+        RETURNING user_id, tconst
+    )
+    INSERT INTO user_interaction_events (user_id, tconst, event_type, created_at)
+    SELECT user_id, tconst, '{EVENT_UNRATE}', CAST(:now AS TIMESTAMP) FROM removed
+    RETURNING seq
+""")
+
+
 async def toggle_favorite(user_id: int, tconst: str):
     """
-    切换收藏状态 (原子操作优化)
+    切换收藏状态 (原子操作：单条语句，一次往返，依赖 uix_user_favorite 唯一约束)
     """
     async with AsyncSessionLocal() as db:
-        # 1. 查询是否存在
-        stmt = select(UserFavorite).where(
-            and_(UserFavorite.user_id == user_id, UserFavorite.tconst == tconst)
+        result = await db.execute(
+            _TOGGLE_FAVORITE_SQL,
+            {'user_id': user_id, 'tconst': tconst, 'created_at': datetime.now()}
         )
-        result = await db.execute(stmt)
-        record = result.scalars().first()
-
-        if record:
-            # 存在 -> 删除
-            await db.delete(record)
-            msg = "已取消收藏"
-            is_fav = False
-        else:
-            # 不存在 -> 新增
-            new_fav = UserFavorite(user_id=user_id, tconst=tconst)
-            db.add(new_fav)
-            msg = "收藏成功"
-            is_fav = True
-
+        is_fav, added, category_mask = result.one()
         await db.commit()
-        return is_fav, msg
+
+    recommendation_cache.invalidate_user(user_id)
+    if added:
+        trending_service.record(tconst, EVENT_FAVORITE, category_mask)
+    return bool(is_fav), "收藏成功" if is_fav else "已取消收藏"
 
 
 # --- 查 (List - 性能优化版) ---
@@ -65,32 +115,57 @@ async def get_my_favorites_paginated(user_id: int, page: int = 1, page_size: int
         return result.scalars().all()
 
 
-async def get_user_favorite_ids(user_id: int):
-    """获取用户所有收藏的ID集合 (用于前端高亮状态判断)"""
-    async with AsyncSessionLocal() as db:
-        stmt = select(UserFavorite.tconst).where(UserFavorite.user_id == user_id)
-        result = await db.execute(stmt)
-        return set(result.scalars().all())
-
-
 # --- 评分相关 (保留) ---
 async def set_user_rating(user_id: int, tconst: str, score: float):
+    """新增或修改评分 (INSERT ... ON CONFLICT DO UPDATE + 记录事件，单条语句)"""
     async with AsyncSessionLocal() as db:
-        stmt = select(UserRating).where(and_(UserRating.user_id == user_id, UserRating.tconst == tconst))
-        result = await db.execute(stmt)
-        record = result.scalars().first()
-        if record:
-            record.rating = score
-        else:
-            db.add(UserRating(user_id=user_id, tconst=tconst, rating=score))
+        try:
+            result = await db.execute(
+                _UPSERT_RATING_SQL,
+                {'user_id': user_id, 'tconst': tconst, 'rating': score, 'now': datetime.now()}
+            )
+        except ProgrammingError as e:
+            # 旧库升级时 init_db 只补列不补约束，没跑去重迁移就会落到这里
+            if 'uix_user_rating' in str(e.orig):
+                raise RuntimeError(
+                    "缺少唯一约束 uix_user_rating，请先运行 python init/dedupe_interactions.py"
+                ) from e
+            raise
+        inserted, category_mask = result.one()
         await db.commit()
+    recommendation_cache.invalidate_user(user_id)
+    # 只有首次评分计入热门趋势 (与收藏只在新增时计入一致)，反复改分不会无限刷高热度
+    if inserted:
+        trending_service.record(tconst, EVENT_RATE, category_mask)
 
 
-async def get_user_ratings_map(user_id: int):
+async def get_interaction_state(user_id: int, tconsts):
+    """
+    只查当前页这些电影的收藏/评分状态 (首页卡片高亮用)
+    收藏和评分用 UNION ALL 合成一条查询，走 (user_id, tconst) 索引，开销只和页大小有关，与用户历史多少无关
+    :param tconsts: 当前页的 tconst 列表
+    :return: (已收藏的 tconst 集合, {tconst: 评分})
+    """
+    tconsts = list(tconsts)
+    if not tconsts:
+        return set(), {}
+
+    favs = select(
+        UserFavorite.tconst, true().label('is_fav'), null().label('rating')
+    ).where(UserFavorite.user_id == user_id, UserFavorite.tconst.in_(tconsts))
+    ratings = select(
+        UserRating.tconst, false().label('is_fav'), UserRating.rating
+    ).where(UserRating.user_id == user_id, UserRating.tconst.in_(tconsts))
+
     async with AsyncSessionLocal() as db:
-        stmt = select(UserRating).where(UserRating.user_id == user_id)
-        result = await db.execute(stmt)
-        return {r.tconst: r.rating for r in result.scalars().all()}
+        result = await db.execute(union_all(favs, ratings))
+        fav_ids, rating_map = set(), {}
+        for tconst, is_fav, rating in result.all():
+            if is_fav:
+                fav_ids.add(tconst)
+            else:
+                rating_map[tconst] = rating
+        return fav_ids, rating_map
 
 
 async def get_my_ratings_paginated(user_id: int, page: int = 1, page_size: int = 20):
@@ -110,14 +185,18 @@ async def get_my_ratings_paginated(user_id: int, page: int = 1, page_size: int =
         return result.all() # 返回 (UserRating对象, 电影名) 的列表
 
 async def delete_user_rating(user_id: int, tconst: str):
-    """物理删除某条评分记录"""
+    """物理删除某条评分记录 (同时记录删除事件)"""
     async with AsyncSessionLocal() as db:
         try:
-            stmt = delete(UserRating).where(
-                and_(UserRating.user_id == user_id, UserRating.tconst == tconst)
+            result = await db.execute(
+                _DELETE_RATING_SQL,
+                {'user_id': user_id, 'tconst': tconst, 'now': datetime.now()}
             )
-            await db.execute(stmt)
+            deleted = result.scalar()
             await db.commit()
+            if deleted is None:
+                return False, "评分记录不存在"
+            recommendation_cache.invalidate_user(user_id)
             return True, "删除成功"
         except Exception as e:
             await db.rollback()
@@ -0,0 +1,158 @@
+# services/model_store.py
+"""
+模型文件仓库 (版本化 + 可 mmap)
+
+目录结构:
+    data/models/<模型名>/
+        CURRENT                 -> 当前生效的版本号 (一行文本)
+        20261018120000000000/   -> 某个版本
+            meta.json           -> 格式版本、构建时间等元信息
+            <数组名>.npy         -> 原生 numpy 数组，加载时 mmap，不经过 pickle
+
+- 写入：先写到临时目录，完整后再 rename 成正式版本，最后原子替换 CURRENT
+- 读取：np.load(mmap_mode='r')，多个 worker 进程通过操作系统页缓存共享同一份物理内存
+- 清理：每个 worker 保存后都会清理旧版本，被取代不足 PRUNE_GRACE_SECONDS 的版本不删，
+  其它 worker 可能还在以它为基线做增量更新或正要加载它
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, "data", "models")
+
+# 文件格式版本，结构不兼容时递增
+ARTIFACT_FORMAT = 1
+
+# 每个模型保留的历史版本数
+KEEP_VERSIONS = 3
+
+# 版本被新版本取代后至少再保留的秒数 (远大于 worker 的热切换检查周期 + 一次增量更新的耗时)
+PRUNE_GRACE_SECONDS = 600
+
+# 版本号格式 (写入时刻)
+VERSION_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def _model_dir(name):
+    return os.path.join(MODELS_DIR, name)
+
+
+def current_version(name):
+    """读取 CURRENT 指针，没有则返回 None"""
+    pointer = os.path.join(_model_dir(name), "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, encoding="utf-8") as f:
+        version = f.read().strip()
+    return version or None
+
+
+def _set_current(name, version):
+    """原子替换 CURRENT 指针 (先写临时文件再 os.replace)"""
+    pointer = os.path.join(_model_dir(name), "CURRENT")
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, pointer)
+
+
+def write_artifact(name, arrays, meta=None, activate=True):
+    """
+    写入一个新版本
+    :param arrays: {数组名: numpy 数组}，不能是 object 类型 (否则无法 mmap)
+    :param meta: 附加元信息 (需可 JSON 序列化)
+    :param activate: 写完后是否立即切换 CURRENT
+    :return: 新版本号
+    """
+    model_dir = _model_dir(name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    version = datetime.now().strftime(VERSION_FORMAT)
+    tmp_dir = os.path.join(model_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    try:
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype == object:
+                raise ValueError(f"数组 {key} 是 object 类型，无法 mmap")
+            np.save(os.path.join(tmp_dir, f"{key}.npy"), array, allow_pickle=False)
+
+        meta = dict(meta or {})
+        meta.update({
+            "format": ARTIFACT_FORMAT,
+            "version": version,
+            "arrays": sorted(arrays.keys()),
+            "created_at": datetime.now().isoformat(),
+        })
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        os.rename(tmp_dir, os.path.join(model_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        _set_current(name, version)
+        prune(name)
+    return version
+
+
+def read_artifact(name, version=None):
+    """
+    以 mmap 方式读取某个版本 (默认 CURRENT)
+    :return: (数组字典, meta)；不存在时返回 (None, None)
+    """
+    version = version or current_version(name)
+    if not version:
+        return None, None
+
+    version_dir = os.path.join(_model_dir(name), version)
+    with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"不支持的模型格式版本: {meta.get('format')}")
+
+    arrays = {
+        key: np.load(os.path.join(version_dir, f"{key}.npy"), mmap_mode="r", allow_pickle=False)
+        for key in meta["arrays"]
+    }
+    return arrays, meta
+
+
+def _version_time(version):
+    """版本号对应的写入时刻，无法解析时返回 None"""
+    try:
+        return datetime.strptime(version, VERSION_FORMAT)
+    except ValueError:
+        return None
+
+
+def prune(name, keep=KEEP_VERSIONS, grace_seconds=PRUNE_GRACE_SECONDS):
+    """
+    只保留最近 keep 个版本 (CURRENT 指向的版本永远保留)
+    多个 worker 各自保存、各自清理：一个版本在被下一个版本取代满 grace_seconds 之前不删，
+    避免删掉其它 worker 正以它为基线 (update_and_save 的 base_version) 或即将加载的版本
+    """
+    model_dir = _model_dir(name)
+    current = current_version(name)
+    versions = sorted(
+        v for v in os.listdir(model_dir)
+        if not v.startswith(".") and os.path.isdir(os.path.join(model_dir, v))
+    )
+    now = datetime.now()
+    candidates = versions[:-keep] if keep else versions
+    for version, successor in zip(candidates, versions[1:]):
+        replaced_at = _version_time(successor)
+        if replaced_at is None or (now - replaced_at).total_seconds() < grace_seconds:
+            # 之后的版本被取代得更晚，同样不能删
+            break
+        if version != current:
+            # 已 mmap 的旧版本在 Linux 上删除后仍可继续读取，直到进程释放
+            shutil.rmtree(os.path.join(model_dir, version), ignore_errors=True)
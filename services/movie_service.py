@@ -1,6 +1,70 @@
-from sqlalchemy import select, func, desc, update, delete, or_, text
+import time
+from collections import namedtuple
+
+from sqlalchemy import select, func, desc, update, delete, or_, and_, text, tuple_, literal_column
 from database import AsyncSessionLocal
 from models import TitleBasics, TitleRatings, MovieSummary
+from services import search_service
+
+# 首页分类位：一部作品可以同时属于多个分类 (例如动画综艺)
+# 在 refresh_movie_summary() 时写入 movie_summary.category_mask，
+# 每个分类在 init/add_index.py 中都有对应的部分索引 (WHERE (category_mask & 位) <> 0)
+CATEGORY_BITS = {
+    'movie': 1,  # movie / tvMovie，且不是动画、纪录片
+    'tv': 2,  # tvSeries / tvMiniSeries，且不是动画
+    'anime': 4,  # 题材含 Animation
+    'variety': 8,  # 题材含 Reality-TV / Talk-Show / Game-Show
+    'doc': 16,  # 题材含 Documentary
+}
+
+# 分类位的判定规则 (SQL 片段，b = title_basics)，与原来首页的 ILIKE 过滤完全一致
+_CATEGORY_RULES = {
+    'movie': "b.titletype IN ('movie', 'tvMovie') AND b.genres NOT ILIKE '%Animation%' "
+             "AND b.genres NOT ILIKE '%Documentary%'",
+    'tv': "b.titletype IN ('tvSeries', 'tvMiniSeries') AND b.genres NOT ILIKE '%Animation%'",
+    'anime': "b.genres ILIKE '%Animation%'",
+    'variety': "b.genres ILIKE '%Reality-TV%' OR b.genres ILIKE '%Talk-Show%' OR b.genres ILIKE '%Game-Show%'",
+    'doc': "b.genres ILIKE '%Documentary%'",
+}
+
+# IMDb 全部题材，每个题材占 movie_summary.genre_mask 的一位
+GENRES = [
+    'Action', 'Adult', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary',
+    'Drama', 'Family', 'Fantasy', 'Film-Noir', 'Game-Show', 'History', 'Horror', 'Music',
+    'Musical', 'Mystery', 'News', 'Reality-TV', 'Romance', 'Sci-Fi', 'Short', 'Sport',
+    'Talk-Show', 'Thriller', 'War', 'Western'
+]
+GENRE_BITS = {g: 1 << i for i, g in enumerate(GENRES)}
+
+
+def _category_mask_sql():
+    return " | ".join(
+        f"(CASE WHEN {rule} THEN {CATEGORY_BITS[cat]} ELSE 0 END)" for cat, rule in _CATEGORY_RULES.items()
+    )
+
+
+def _genre_mask_sql():
+    # 按逗号拆分后精确匹配 (避免 Music 误匹配 Musical)
+    return " + ".join(
+        f"(CASE WHEN '{g}' = ANY(string_to_array(b.genres, ',')) THEN {bit} ELSE 0 END)"
+        for g, bit in GENRE_BITS.items()
+    )
+
+
+def category_clause(category):
+    """
+    分类过滤条件；位运算常量直接写进 SQL (不用绑定参数)，
+    这样 PostgreSQL 才能匹配上对应的部分索引
+    """
+    bit = CATEGORY_BITS[category]
+    return MovieSummary.category_mask.op('&')(literal_column(str(bit))) != literal_column('0')
+
+
+def apply_category_filter(query, category):
+    """为 movie_summary 查询追加分类过滤 ('all' 或未知分类不过滤)"""
+    if category in CATEGORY_BITS:
+        query = query.where(category_clause(category))
+    return query
 
 
 # --- 数据库操作逻辑 (CRUD) ---
@@ -77,14 +141,12 @@ async def get_movies_paginated(page: int, page_size: int, search_query=None):
         # 如果有搜索内容，添加过滤条件
         if search_query:
             query = query.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),
-                    TitleBasics.tconst.ilike(f"%{search_query}%")
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleBasics.tconst])
             )
 
-        # 保持原有排序和分页
-        query = query.order_by(TitleBasics.tconst).offset(offset).limit(page_size)
+        # 按编号排序分页 (搜索标题时相关度高的排前面)
+        query = search_service.order_by_rank(query, search_query, TitleBasics.primaryTitle, TitleBasics.tconst)
+        query = query.offset(offset).limit(page_size)
         result = await db.execute(query)
         return result.scalars().all()
 
@@ -97,10 +159,7 @@ async def get_movie_count(search_query=None):
         # 如果有搜索内容，添加过滤条件
         if search_query:
             query = query.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),  # 模糊匹配标题 (忽略大小写)
-                    TitleBasics.tconst.ilike(f"%{search_query}%")  # 模糊匹配编号
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleBasics.tconst])
             )
 
         result = await db.execute(query)
@@ -115,6 +174,17 @@ async def get_poster_path(tconst):
         return result.scalar()
 
 
+async def get_summaries_by_ids(tconsts, category='all'):
+    """按主键批量取 MovieSummary，按传入顺序返回 (不存在或不属于 category 的跳过)"""
+    if not tconsts:
+        return []
+    async with AsyncSessionLocal() as db:
+        stmt = apply_category_filter(select(MovieSummary).where(MovieSummary.tconst.in_(tconsts)), category)
+        result = await db.execute(stmt)
+        by_id = {m.tconst: m for m in result.scalars().all()}
+    return [by_id[t] for t in tconsts if t in by_id]
+
+
 # --- 【新增】数据同步功能 (ETL) ---
 async def refresh_movie_summary():
     """
@@ -126,10 +196,11 @@ async def refresh_movie_summary():
             await db.execute(text("TRUNCATE TABLE movie_summary"))
 
             # 2. 执行插入 (注意新增了 titleType 字段)
-            # 我们直接从 title_basics 表里取 titletype
-            stmt = text("""
+            # 我们直接从 title_basics 表里取 titletype，同时预先算好分类位和题材位
+            stmt = text(f"""
                         INSERT INTO movie_summary (tconst, "titleType", "primaryTitle", "startYear", "runtimeMinutes", genres,
-                                                   "averageRating", "numVotes", poster_path)
+                                                   "averageRating", "numVotes", poster_path,
+                                                   category_mask, genre_mask)
                         SELECT b.tconst,
                                b.titletype,      -- 【新增】写入类型
                                b.primarytitle,
@@ -138,109 +209,207 @@ async def refresh_movie_summary():
                                b.genres,
                                r.averagerating,
                                r.numvotes,
-                               b.poster_path
+                               b.poster_path,
+                               {_category_mask_sql()},
+                               {_genre_mask_sql()}
                         FROM title_basics b
                                  LEFT JOIN title_ratings r ON b.tconst = r.tconst
                         WHERE b.titletype IN ('movie', 'tvSeries', 'tvMiniSeries', 'tvMovie', 'short')
                         """)
             await db.execute(stmt)
             await db.commit()
-            return True, "缓存重建成功！"
         except Exception as e:
             await db.rollback()
             return False, f"同步失败: {e}"
 
+    # 3. 重建首页分页计数缓存和冷启动热门池
+    await warm_homepage_counts()
+    await warm_popular_pools()
+    return True, "缓存重建成功！"
+
 
 # --- 【修改】首页查询接口 (改用新表) ---
+def _apply_homepage_filters(query, search_query=None, category='all'):
+    """
+    首页的搜索 + 分类导航过滤条件
+    get_homepage_movies / get_homepage_movies_after / get_homepage_movie_count 共用，保证逻辑完全一致
+    :param category: 'all' | 'movie' | 'tv' | 'anime' | 'variety' | 'doc'
+    """
+    # --- 1. 处理搜索 (trigram 索引；短词由分页 LIMIT 和封顶计数限定扫描量) ---
+    if search_query:
+        query = query.where(search_service.text_match(MovieSummary.primaryTitle, search_query))
+
+    # --- 2. 处理分类导航 (预计算的分类位，走部分索引) ---
+    return apply_category_filter(query, category)
+
+
+def _apply_homepage_order(query, search_query=None):
+    """
+    排序：搜索按相关度，浏览 (以及没有相关度的编号查询/短词) 按热度
+    相关度/热度相同时以 tconst 兜底，保证顺序稳定 (游标分页的前提)，
+    热度排序由索引 ix_movie_summary_votes_tconst ("numVotes" DESC NULLS LAST, tconst DESC) 支撑
+    """
+    if search_service.rank(MovieSummary.primaryTitle, search_query) is not None:
+        return search_service.order_by_rank(query, search_query, MovieSummary.primaryTitle, MovieSummary.tconst)
+    return query.order_by(desc(MovieSummary.numVotes).nulls_last(), desc(MovieSummary.tconst))
+
+
 async def get_homepage_movies(page: int, page_size: int, search_query=None, category='all'):
     """
-    支持分类筛选的首页查询
+    支持分类筛选的首页查询 (OFFSET 分页，只适合前几页；翻页请用 get_homepage_movies_after)
     :param category: 'all' | 'movie' | 'tv' | 'anime' | 'variety' | 'doc'
     """
     offset = (page - 1) * page_size
     async with AsyncSessionLocal() as db:
-        query = select(MovieSummary)
-
-        # --- 1. 处理搜索 ---
-        if search_query:
-            query = query.where(MovieSummary.primaryTitle.ilike(f"%{search_query}%"))
-
-        # --- 2. 处理分类导航 (核心逻辑) ---
-        if category == 'movie':
-            # 电影：类型为 movie 或 tvMovie
-            query = query.where(MovieSummary.titleType.in_(['movie', 'tvMovie']))
-            # 排除动漫和纪录片，防止混杂 (可选)
-            query = query.where(MovieSummary.genres.notilike('%Animation%'))
-            query = query.where(MovieSummary.genres.notilike('%Documentary%'))
-
-        elif category == 'tv':
-            # 剧集：类型为 tvSeries 或 tvMiniSeries
-            query = query.where(MovieSummary.titleType.in_(['tvSeries', 'tvMiniSeries']))
-            # 排除动漫
-            query = query.where(MovieSummary.genres.notilike('%Animation%'))
-
-        elif category == 'anime':
-            # 动漫：类型不限，但题材必须包含 Animation
-            query = query.where(MovieSummary.genres.ilike('%Animation%'))
-
-        elif category == 'variety':
-            # 综艺：IMDb 中通常是 Reality-TV, Talk-Show, Game-Show
-            query = query.where(or_(
-                MovieSummary.genres.ilike('%Reality-TV%'),
-                MovieSummary.genres.ilike('%Talk-Show%'),
-                MovieSummary.genres.ilike('%Game-Show%')
-            ))
-
-        elif category == 'doc':
-            # 纪录片
-            query = query.where(MovieSummary.genres.ilike('%Documentary%'))
-
-        # --- 3. 排序 (按热度) ---
-        if search_query:
-            query = query.order_by(MovieSummary.tconst)
-        else:
-            query = query.order_by(desc(MovieSummary.numVotes).nulls_last())
-
+        query = _apply_homepage_filters(select(MovieSummary), search_query, category)
+        query = _apply_homepage_order(query, search_query)
         query = query.offset(offset).limit(page_size)
         result = await db.execute(query)
 
         return result.scalars().all()
 
 
+async def get_homepage_movies_after(page_size: int, search_query=None, category='all', after=None):
+    """
+    游标 (Keyset) 分页：从上一页最后一条之后继续取，不再 OFFSET 扫描并丢弃前面的所有行，
+    翻到多深都是一次索引范围扫描
+    :param after: 上一页返回的 next_cursor，第一页传 None
+    :return: (本页电影列表, next_cursor)；没有下一页时 next_cursor 为 None
+    """
+    # 搜索时游标是 (相关度, tconst)，浏览时是 (投票数, tconst)
+    score = search_service.rank(MovieSummary.primaryTitle, search_query) if search_query else None
+    columns = [MovieSummary] if score is None else [MovieSummary, score.label('score')]
+
+    async with AsyncSessionLocal() as db:
+        base = _apply_homepage_filters(select(*columns), search_query, category)
+        query = base
+
+        votes = None
+        if after is not None:
+            votes, tconst = after
+            if score is not None:
+                query = query.where(or_(score < votes, and_(score == votes, MovieSummary.tconst > tconst)))
+            elif votes is None:
+                # 已经翻到没有投票数的尾部 (NULLS LAST)
+                query = query.where(MovieSummary.numVotes.is_(None), MovieSummary.tconst < tconst)
+            else:
+                # 单纯的行比较才能走索引范围扫描；它不会匹配 NULL，没有投票数的尾部在下面单独取
+                query = query.where(tuple_(MovieSummary.numVotes, MovieSummary.tconst) < tuple_(votes, tconst))
+
+        # 多取一条，用来判断是否还有下一页
+        query = _apply_homepage_order(query, search_query).limit(page_size + 1)
+        rows = list((await db.execute(query)).all())
+
+        if score is None and votes is not None and len(rows) <= page_size:
+            # 有投票数的部分已经取完，用没有投票数的尾部补齐这一页
+            tail = _apply_homepage_order(base.where(MovieSummary.numVotes.is_(None)), search_query)
+            rows += (await db.execute(tail.limit(page_size + 1 - len(rows)))).all()
+        movies = [row[0] for row in rows]
+
+        next_cursor = None
+        if len(movies) > page_size:
+            movies = movies[:page_size]
+            last = movies[-1]
+            key = rows[page_size - 1].score if score is not None else last.numVotes
+            next_cursor = (key, last.tconst)
+
+        return movies, next_cursor
+
+
+# --- 首页计数缓存 ---
+# 不带搜索的分类总数只在 refresh_movie_summary() 后变化：重建时清空并预热
+# 带搜索的计数采用封顶计数，最多数到 SEARCH_COUNT_CAP 条就停，避免为了一个页码把所有匹配行都数一遍
+COUNT_CACHE_TTL = 600
+COUNT_CACHE_MAX = 1024
+SEARCH_COUNT_CAP = 1000
+
+_count_cache = {}  # (分类, 规范化搜索词) -> (过期时间, 数量)
+
+
+def _count_key(search_query, category):
+    # 搜索不区分大小写，大小写/空白不同的搜索词共用一个缓存
+    return category, search_service.normalize(search_query).lower() or None
+
+
+def is_capped_count(count):
+    """计数是否触顶 (真实数量可能更多)"""
+    return count > SEARCH_COUNT_CAP
+
+
+async def _count_homepage_movies(db, search_query, category):
+    if not search_query:
+        query = _apply_homepage_filters(select(func.count(MovieSummary.tconst)), search_query, category)
+        return (await db.execute(query)).scalar()
+
+    # 封顶计数：子查询最多取 CAP+1 行
+    matched = _apply_homepage_filters(select(MovieSummary.tconst), search_query, category) \
+        .limit(SEARCH_COUNT_CAP + 1).subquery()
+    return (await db.execute(select(func.count()).select_from(matched))).scalar()
+
+
 async def get_homepage_movie_count(search_query=None, category='all'):
     """
-    获取符合筛选条件的电影总数，用于计算分页
+    获取符合筛选条件的电影总数，用于计算分页 (带缓存)
     逻辑必须与 get_homepage_movies 保持完全一致
+    带搜索时最多返回 SEARCH_COUNT_CAP + 1，可用 is_capped_count() 判断是否触顶
     """
+    key = _count_key(search_query, category)
+    entry = _count_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+
     async with AsyncSessionLocal() as db:
-        query = select(func.count(MovieSummary.tconst))
+        count = await _count_homepage_movies(db, search_query, category)
+
+    if len(_count_cache) >= COUNT_CACHE_MAX:
+        _count_cache.pop(next(iter(_count_cache)))
+    _count_cache[key] = (time.monotonic() + COUNT_CACHE_TTL, count)
+    return count
 
-        # --- 1. 处理搜索 ---
-        if search_query:
-            query = query.where(MovieSummary.primaryTitle.ilike(f"%{search_query}%"))
 
-        # --- 2. 处理分类导航 (复制 get_homepage_movies 的逻辑) ---
-        if category == 'movie':
-            query = query.where(MovieSummary.titleType.in_(['movie', 'tvMovie']))
-            query = query.where(MovieSummary.genres.notilike('%Animation%'))
-            query = query.where(MovieSummary.genres.notilike('%Documentary%'))
+async def warm_homepage_counts():
+    """重建缓存后：清空计数缓存，并预先算好每个分类的总数"""
+    _count_cache.clear()
+    async with AsyncSessionLocal() as db:
+        for category in ['all', *CATEGORY_BITS]:
+            count = await _count_homepage_movies(db, None, category)
+            _count_cache[_count_key(None, category)] = (time.monotonic() + COUNT_CACHE_TTL, count)
 
-        elif category == 'tv':
-            query = query.where(MovieSummary.titleType.in_(['tvSeries', 'tvMiniSeries']))
-            query = query.where(MovieSummary.genres.notilike('%Animation%'))
 
-        elif category == 'anime':
-            query = query.where(MovieSummary.genres.ilike('%Animation%'))
+# --- 冷启动热门池 ---
+# 每个分类按热度排好的前 POPULAR_POOL_SIZE 部，只存渲染需要的几个字段 (namedtuple，不持有 ORM 对象)
+# refresh_movie_summary() 之后和系统启动时重建，推荐兜底直接读内存，不访问数据库
+POPULAR_POOL_SIZE = 50
 
-        elif category == 'variety':
-            query = query.where(or_(
-                MovieSummary.genres.ilike('%Reality-TV%'),
-                MovieSummary.genres.ilike('%Talk-Show%'),
-                MovieSummary.genres.ilike('%Game-Show%')
-            ))
+PopularMovie = namedtuple('PopularMovie', [
+    'tconst', 'primaryTitle', 'startYear', 'genres', 'averageRating', 'numVotes', 'poster_path'
+])
 
-        elif category == 'doc':
-            query = query.where(MovieSummary.genres.ilike('%Documentary%'))
+_popular_pools = {}  # 分类 -> (PopularMovie, ...)
+
+
+async def warm_popular_pools():
+    """重建每个分类的热门池"""
+    pools = {}
+    try:
+        async with AsyncSessionLocal() as db:
+            for category in ['all', *CATEGORY_BITS]:
+                query = select(*(getattr(MovieSummary, f) for f in PopularMovie._fields))
+                query = _apply_homepage_order(apply_category_filter(query, category))
+                result = await db.execute(query.limit(POPULAR_POOL_SIZE))
+                pools[category] = tuple(PopularMovie(*row) for row in result.all())
+    except Exception as e:
+        print(f"⚠️ 热门池构建失败: {e}")
+        return
+
+    _popular_pools.clear()
+    _popular_pools.update(pools)
+
+
+def get_popular_movies(category='all', limit=10):
+    """
+    该分类按热度排序的前 limit 部 (纯内存)
+    热门池还没建好时返回空列表，调用方自行降级
+    """
+    return list(_popular_pools.get(category, ())[:limit])
 
-        result = await db.execute(query)
-        return result.scalar()
\ No newline at end of file
@@ -1,6 +1,7 @@
-from sqlalchemy import select, func, update, delete, or_
+from sqlalchemy import select, func, update, delete
 from database import AsyncSessionLocal
 from models import NameBasics
+from services import search_service
 
 
 async def get_person_count(search_query=None):
@@ -11,10 +12,7 @@ async def get_person_count(search_query=None):
         # 如果有搜索关键词，添加过滤条件
         if search_query:
             query = query.where(
-                or_(
-                    NameBasics.primaryName.ilike(f"%{search_query}%"),  # 模糊匹配姓名
-                    NameBasics.nconst.ilike(f"%{search_query}%")  # 模糊匹配编号
-                )
+                search_service.search_filter(search_query, NameBasics.primaryName, [NameBasics.nconst])
             )
 
         result = await db.execute(query)
@@ -30,14 +28,12 @@ async def get_people_paginated(page: int, page_size: int, search_query=None):
         # 如果有搜索关键词，添加过滤条件
         if search_query:
             query = query.where(
-                or_(
-                    NameBasics.primaryName.ilike(f"%{search_query}%"),  # 模糊匹配姓名
-                    NameBasics.nconst.ilike(f"%{search_query}%")  # 模糊匹配编号
-                )
+                search_service.search_filter(search_query, NameBasics.primaryName, [NameBasics.nconst])
             )
 
-        # 排序并分页
-        query = query.order_by(NameBasics.nconst).offset(offset).limit(page_size)
+        # 排序并分页 (搜索姓名时相关度高的排前面)
+        query = search_service.order_by_rank(query, search_query, NameBasics.primaryName, NameBasics.nconst)
+        query = query.offset(offset).limit(page_size)
 
         result = await db.execute(query)
         return result.scalars().all()
@@ -1,6 +1,7 @@
-from sqlalchemy import select, func, update, delete, or_
+from sqlalchemy import select, func, update, delete
 from database import AsyncSessionLocal
 from models import TitleRatings, TitleBasics
+from services import search_service
 
 
 async def get_rating_count(search_query=None):
@@ -13,10 +14,7 @@ async def get_rating_count(search_query=None):
             # 必须联表才能搜到 primaryTitle
             query = query.join(TitleBasics, TitleRatings.tconst == TitleBasics.tconst)
             query = query.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),  # 搜电影名
-                    TitleRatings.tconst.ilike(f"%{search_query}%")  # 搜编号
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleRatings.tconst])
             )
 
         result = await db.execute(query)
@@ -40,14 +38,12 @@ async def get_ratings_paginated(page: int, page_size: int, search_query=None):
         # 如果有搜索内容，添加过滤条件
         if search_query:
             stmt = stmt.where(
-                or_(
-                    TitleBasics.primaryTitle.ilike(f"%{search_query}%"),  # 搜电影名
-                    TitleRatings.tconst.ilike(f"%{search_query}%")  # 搜编号
-                )
+                search_service.search_filter(search_query, TitleBasics.primaryTitle, [TitleRatings.tconst])
             )
 
-        # 排序并分页
-        stmt = stmt.order_by(TitleRatings.tconst).offset(offset).limit(page_size)
+        # 排序并分页 (搜索标题时相关度高的排前面)
+        stmt = search_service.order_by_rank(stmt, search_query, TitleBasics.primaryTitle, TitleRatings.tconst)
+        stmt = stmt.offset(offset).limit(page_size)
 
         result = await db.execute(stmt)
         # 返回的是 [(TitleRatings对象, 电影名字符串), ...] 的列表
@@ -0,0 +1,92 @@
+# services/recommendation_cache.py
+"""
+进程内的个性化推荐结果缓存 (LRU + TTL)
+
+- Key: (推荐来源, user_id, 分类, 条数, 模型版本)，模型热切换后旧结果自然失效
+- 用户产生新评分/收藏时，interaction_service 调用 invalidate_user() 使该用户的缓存全部失效
+- 缓存和失效都只在本进程内：用户的请求落到其它 worker 时，那边的旧结果要等 TTL_SECONDS 过期才会刷新，
+  跨 worker 的新鲜度以 TTL 为上限
+- 命中/未命中计数可在管理后台查看
+"""
+import time
+from collections import OrderedDict
+
+# 最多缓存的结果条目数
+MAX_ENTRIES = 4096
+
+# 单条结果的有效期 (秒)，也是其它 worker 上的旧结果最长还能被命中多久
+TTL_SECONDS = 600
+
+# 最多记录多少个用户的缓存代数，超过后整体换代 (见 invalidate_user)
+MAX_TRACKED_USERS = MAX_ENTRIES * 4
+
+_entries = OrderedDict()  # key -> (过期时间, 结果)
+
+# 每个用户的缓存代数：失效时 +1，旧代数的 key 再也不会被命中，随 LRU 淘汰
+_user_generation = {}
+
+# 整体代数：_user_generation 记满后清空并 +1，
+# 清空前已发出的 key (包括还在计算、稍后才 put 的) 带着旧的整体代数，不会与清空后重新从 0 数起的代数混淆
+_epoch = 0
+
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+
+def _key(source, user_id, category, limit, model_version):
+    return source, user_id, _epoch, _user_generation.get(user_id, 0), category, limit, model_version
+
+
+def get(source, user_id, category, limit, model_version=None):
+    """
+    :return: (key, 结果)；未命中 (或已过期) 时结果为 None
+    key 在查询时就确定了用户的缓存代数，回填时把它原样交给 put()：
+    计算期间用户如果产生了新互动 (代数已 +1)，旧数据算出的结果只会落在旧代数下，不会被当成新结果命中
+    """
+    key = _key(source, user_id, category, limit, model_version)
+    entry = _entries.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        if entry is not None:
+            del _entries[key]
+        _stats['misses'] += 1
+        return key, None
+
+    _entries.move_to_end(key)
+    _stats['hits'] += 1
+    return key, entry[1]
+
+
+def put(key, result):
+    """回填 get() 未命中时返回的 key"""
+    _entries[key] = (time.monotonic() + TTL_SECONDS, result)
+    _entries.move_to_end(key)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+        _stats['evictions'] += 1
+
+
+def invalidate_user(user_id):
+    """
+    用户的互动发生变化：让其所有推荐缓存失效
+    代数表只增不减，记满 MAX_TRACKED_USERS 个用户后整体换代：清空代数表和全部缓存
+    (旧 key 都带着旧的整体代数，已经无法命中)
+    """
+    global _epoch
+    _user_generation[user_id] = _user_generation.get(user_id, 0) + 1
+    _stats['invalidations'] += 1
+    if len(_user_generation) > MAX_TRACKED_USERS:
+        _epoch += 1
+        _user_generation.clear()
+        _entries.clear()
+
+
+def clear():
+    _entries.clear()
+
+
+def get_stats():
+    total = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'size': len(_entries),
+        'hit_rate': round(_stats['hits'] / total, 4) if total else 0.0,
+    }
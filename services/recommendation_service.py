@@ -1,14 +1,16 @@
 # services/recommendation_service.py
-import pandas as pd
-import pickle
+import asyncio
 import os
-from sqlalchemy import select, desc, or_
-from sklearn.metrics.pairwise import cosine_similarity
-from unicodedata import category
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, desc
 
 from database import AsyncSessionLocal
-from models import UserRating, MovieSummary, UserFavorite
+from models import UserRating, UserFavorite, User
 from models import SparkRecommendation
+from services import event_log, factor_model, model_store, movie_service, recommendation_cache, segment_service, \
+    similarity_model
 
 # === 【修改】路径配置 ===
 # 1. 获取当前文件(recommendation_service.py) 的上一级目录 -> 即 services/
@@ -22,22 +24,55 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-# 5. 拼接最终的模型文件路径
-MODEL_FILE = os.path.join(DATA_DIR, "recommendation_model.pkl")
+# 5. 模型文件由 model_store 管理：data/models/item_cf/<版本>/*.npy (加载时 mmap)
+
+# 当前生效的 similarity_model.SimilarityModel
+# 只通过整体替换引用来切换版本 (赋值是原子的)，正在处理的请求会继续使用它开始时拿到的旧版本
+_model = None
+
+# 当前生效的 factor_model.FactorModel (spark_runner 导出的 ALS 因子)，同样整体替换引用来切换版本
+_als_model = None
+
+# 训练在独立进程中执行，不阻塞事件循环
+_executor = None
+
+# 后台训练状态 (供管理后台展示)
+_training = {
+    'running': False,
+    'started_at': None,
+    'finished_at': None,
+    'last_error': None,
+}
+_training_task = None
+
+# 增量更新：一次涉及的用户数超过该值时，直接全量重训更划算
+INCREMENTAL_MAX_USERS = 5000
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1)
+    return _executor
 
-_similarity_df = None
+
+def _swap_model(model):
+    """原子切换当前模型"""
+    global _model
+    _model = model
 
 
 # --- 1. 模型训练与保存 (后台调用) ---
 async def train_model():
     """
-    全量训练模型：读取数据库 -> 计算矩阵 -> 保存到磁盘
+    全量训练模型：读取数据库 -> (子进程) 稀疏相似度 + 写入新版本 -> 热切换
     """
-    global _similarity_df
-
     print("🧠 [Training] 开始训练推荐模型...")
 
     async with AsyncSessionLocal() as db:
+        # 1.0 先记下当前事件序号 (之后写入的互动由增量更新处理；重复处理是幂等的)
+        event_seq = await event_log.get_latest_seq(db)
+
         # 1.1 获取所有评分数据
         rating_stmt = select(UserRating.user_id, UserRating.tconst, UserRating.rating)
         rating_res = await db.execute(rating_stmt)
@@ -52,210 +87,276 @@ async def train_model():
         return False, "数据库中没有足够的互动数据，无法训练。"
 
     try:
-        # 2. 数据预处理
-        # 构造评分列表
-        data_list = [{'user_id': r[0], 'tconst': r[1], 'rating': r[2]} for r in ratings_data]
+        # 2. 数据预处理：评分 + 收藏 (权重 10.0) 拼成三元组
+        # 既收藏又评分的情况在构造矩阵时去重，取最高分
+        user_ids = [r[0] for r in ratings_data] + [f[0] for f in fav_data]
+        tconsts = [r[1] for r in ratings_data] + [f[1] for f in fav_data]
+        values = [r[2] or 0.0 for r in ratings_data] + [10.0] * len(fav_data)
+
+        # 3. 在进程池中构建稀疏矩阵、计算 Top-K 相似度并写入新版本 (CURRENT 随之切换)
+        print(f"   - 正在计算 {len(set(tconsts))} 部电影的稀疏相似度矩阵...")
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(
+            _get_executor(), similarity_model.train_and_save, user_ids, tconsts, values, event_seq
+        )
 
-        # 将收藏合并进去 (权重设为 10.0)
-        for f in fav_data:
-            data_list.append({'user_id': f[0], 'tconst': f[1], 'rating': 10.0})
+        # 4. mmap 加载新版本并热切换
+        model = similarity_model.SimilarityModel.load(version)
+        _swap_model(model)
 
-        # 转为 DataFrame
-        df = pd.DataFrame(data_list)
+        # 5. 人群分段推荐 (冷启动) 与模型同批次离线生成
+        _, segment_msg = await segment_service.rebuild_segments()
 
-        # 去重：如果用户既收藏又评分，取最高分
-        df = df.groupby(['user_id', 'tconst'], as_index=False)['rating'].max()
+        return True, f"训练完成！模型版本 {version}，包含 {model.item_count} 部关联电影。{segment_msg}"
 
-        # 3. 构建透视表 (Item-User Matrix)
-        # 行=电影(tconst), 列=用户(user_id), 值=评分
-        # 我们基于物品(Item-Based)计算相似度，所以电影做行
-        pivot_matrix = df.pivot(index='tconst', columns='user_id', values='rating').fillna(0)
+    except Exception as e:
+        print(f"❌ 训练失败: {e}")
+        return False, f"训练出错: {str(e)}"
 
-        # 4. 计算余弦相似度
-        # 这一步计算量最大，几千条数据很快，几百万条需要优化
-        print(f"   - 正在计算 {len(pivot_matrix)} 部电影的相似度矩阵...")
-        sparse_matrix = pivot_matrix.values
-        cosine_sim = cosine_similarity(sparse_matrix)
 
-        # 5. 转回 DataFrame (方便通过 tconst 索引查找)
-        _similarity_df = pd.DataFrame(cosine_sim, index=pivot_matrix.index, columns=pivot_matrix.index)
+async def update_model_incremental():
+    """
+    增量更新：只处理模型的事件序号之后有互动事件 (评分/收藏/删除/取消) 的用户
+    1. 从事件流水按 seq 区间找出这些用户，读取他们当前的完整互动 (整行替换旧互动，删除也能正确反映)
+    2. 子进程中更新互动矩阵和范数，只为受影响的电影现算点积并重算邻居行，写入新版本
+    3. 热切换
+    没有可增量的模型时退化为全量训练
+    """
+    model = _model
+    if model is None or not model.has_state or model.event_seq is None:
+        return await train_model()
+
+    async with AsyncSessionLocal() as db:
+        new_seq = await event_log.get_latest_seq(db)
+        if new_seq <= model.event_seq:
+            return True, "没有新的互动数据，模型已是最新。"
+
+        affected = await event_log.get_changed_users(model.event_seq, new_seq, db)
+        if not affected:
+            return True, "没有新的互动数据，模型已是最新。"
+        if len(affected) > INCREMENTAL_MAX_USERS:
+            return await train_model()
+
+        ratings_data = (await db.execute(
+            select(UserRating.user_id, UserRating.tconst, UserRating.rating).where(UserRating.user_id.in_(affected))
+        )).all()
+        fav_data = (await db.execute(
+            select(UserFavorite.user_id, UserFavorite.tconst).where(UserFavorite.user_id.in_(affected))
+        )).all()
 
-        # 6. 持久化保存 (Pickle)
-        with open(MODEL_FILE, 'wb') as f:
-            pickle.dump(_similarity_df, f)
+    try:
+        user_ids = [r[0] for r in ratings_data] + [f[0] for f in fav_data]
+        tconsts = [r[1] for r in ratings_data] + [f[1] for f in fav_data]
+        values = [r[2] or 0.0 for r in ratings_data] + [10.0] * len(fav_data)
+
+        loop = asyncio.get_running_loop()
+        version, updated_rows = await loop.run_in_executor(
+            _get_executor(), similarity_model.update_and_save,
+            model.version, user_ids, tconsts, values, new_seq, list(affected)
+        )
 
-        return True, f"训练完成！模型已保存，包含 {len(_similarity_df)} 部关联电影。"
+        _swap_model(similarity_model.SimilarityModel.load(version))
+        return True, f"增量更新完成！版本 {version}，{len(affected)} 位用户，重算 {updated_rows} 部电影的邻居。"
 
     except Exception as e:
-        print(f"❌ 训练失败: {e}")
-        return False, f"训练出错: {str(e)}"
+        print(f"❌ 增量更新失败: {e}")
+        return False, f"增量更新出错: {str(e)}"
+
+
+async def _run_background(job):
+    _training.update(running=True, started_at=datetime.now(), last_error=None)
+    try:
+        success, msg = await job()
+        if not success:
+            _training['last_error'] = msg
+    except Exception as e:
+        _training['last_error'] = str(e)
+    finally:
+        _training.update(running=False, finished_at=datetime.now())
+
+
+def start_background_training():
+    """
+    触发后台重新训练 (立即返回)
+    :return: (是否已启动, 提示信息)
+    """
+    global _training_task
+    if _training['running']:
+        return False, "已有训练任务在进行中"
+    _training['running'] = True
+    _training_task = asyncio.create_task(_run_background(train_model))
+    return True, "已开始后台训练，完成后模型将自动热切换"
+
+
+async def run_scheduled_update():
+    """定时任务：把最近的评分/收藏增量合入模型 (已有训练任务时跳过)"""
+    if _training['running'] or _model is None:
+        return
+    await _run_background(update_model_incremental)
+
+
+def get_model_status():
+    """当前模型与训练任务的状态"""
+    model = _model
+    return {
+        'loaded': model is not None,
+        'version': model.version if model else None,
+        'built_at': model.built_at.isoformat() if model else None,
+        'item_count': model.item_count if model else 0,
+        'neighbor_count': int(model.similarity.nnz) if model else 0,
+        'training': _training['running'],
+        'training_started_at': _training['started_at'].isoformat() if _training['started_at'] else None,
+        'training_finished_at': _training['finished_at'].isoformat() if _training['finished_at'] else None,
+        'last_error': _training['last_error'],
+        'cache': recommendation_cache.get_stats(),
+        'als_version': _als_model.version if _als_model is not None else None,
+    }
 
 
 # --- 2. 模型加载 (系统启动调用) ---
 def load_model():
     """
-    从磁盘加载模型到内存
+    从磁盘加载模型 (mmap 零拷贝，多个 worker 进程共享页缓存)
     """
-    global _similarity_df
-
-    if not os.path.exists(MODEL_FILE):
-        print("⚠️ [Model] 未找到本地模型文件，系统将使用冷启动策略。")
+    try:
+        model = similarity_model.SimilarityModel.load()
+        if model is None:
+            print("⚠️ [Model] 未找到本地模型文件，系统将使用冷启动策略。")
+            return False
+
+        _swap_model(model)
+        print(f"✅ [Model] 模型加载成功！版本: {model.version}, 电影数: {model.item_count}, "
+              f"邻居数: {model.similarity.nnz}")
+        return True
+    except Exception as e:
+        print(f"❌ [Model] 模型加载失败: {e}")
         return False
 
+
+def load_als_model():
+    """加载 spark_runner 导出的 ALS 因子 (mmap)；没有时前台继续使用 spark_recommendations 表"""
+    global _als_model
     try:
-        print("📂 [Model] 正在加载本地模型...")
-        with open(MODEL_FILE, 'rb') as f:
-            _similarity_df = pickle.load(f)
-        print(f"✅ [Model] 模型加载成功！矩阵大小: {_similarity_df.shape}")
+        model = factor_model.FactorModel.load()
+        if model is None:
+            return False
+        _als_model = model
+        print(f"✅ [ALS] 因子加载成功！版本: {model.version}, 用户数: {model.user_count}, "
+              f"电影数: {model.item_count}, rank: {model.rank}")
         return True
     except Exception as e:
-        print(f"❌ [Model] 模型加载失败: {e}")
+        print(f"❌ [ALS] 因子加载失败: {e}")
         return False
 
 
-def _apply_category_filter(query, category):
+def reload_if_changed():
     """
-    根据分类为 SQL 查询添加过滤条件
+    检查 CURRENT 指针，版本变化时热切换
+    (其它 worker 进程训练出新版本、或 spark_runner 导出新因子后，本进程定时调用即可跟上，无需重启)
     """
-    if category == 'movie':
-        # 电影：过滤掉纪录片和动画(如果想分得细的话)，保留 Movie 和 TV Movie
-        query = query.where(MovieSummary.titleType.in_(['movie', 'tvMovie']))
-        query = query.where(MovieSummary.genres.notilike('%Documentary%'))
-    elif category == 'tv':
-        query = query.where(MovieSummary.titleType.in_(['tvSeries', 'tvMiniSeries']))
-    elif category == 'anime':
-        query = query.where(MovieSummary.genres.ilike('%Animation%'))
-    elif category == 'variety':
-        query = query.where(or_(
-            MovieSummary.genres.ilike('%Reality-TV%'),
-            MovieSummary.genres.ilike('%Talk-Show%'),
-            MovieSummary.genres.ilike('%Game-Show%')
-        ))
-    elif category == 'doc':
-        query = query.where(MovieSummary.genres.ilike('%Documentary%'))
-
-    return query
+    changed = False
+    model = _model
+    latest = model_store.current_version(similarity_model.MODEL_NAME)
+    if latest and (model is None or model.version != latest):
+        changed = load_model()
+
+    als = _als_model
+    latest = model_store.current_version(factor_model.MODEL_NAME)
+    if latest and (als is None or als.version != latest):
+        changed = load_als_model() or changed
+    return changed
+
+
+def is_model_loaded():
+    return _model is not None
 
 
 # --- 3. 获取推荐结果 (前台调用) ---
-async def get_recommendations(user_id: int, limit=8,category='all'):
+async def _load_watched_movies(user_id):
     """
-    核心推荐逻辑
+    用户感兴趣的种子电影 {tconst: 权重}：评分最高的 20 部 (评分作为权重) + 全部收藏 (高权重 10 分)
     """
-    # 如果模型没加载，直接返回空（前台会降级到热门推荐）
-    if _similarity_df is None:
-        return []
-
     async with AsyncSessionLocal() as db:
-        # 1. 获取当前用户喜欢过的电影 (评分>6 或 收藏)
         stmt = select(UserRating).where(UserRating.user_id == user_id).order_by(UserRating.rating.desc()).limit(20)
         user_ratings = (await db.execute(stmt)).scalars().all()
 
-        # 同时也查出收藏的
         stmt_fav = select(UserFavorite.tconst).where(UserFavorite.user_id == user_id)
         user_favs = (await db.execute(stmt_fav)).scalars().all()
 
-    # 如果是纯新用户（没看过也没收藏过），返回空
-    if not user_ratings and not user_favs:
-        return []
-
-    # 2. 收集用户感兴趣的种子电影
-    # 格式: {tconst: weight}
-    watched_movies = {}
-
-    # 评分作为权重
-    for r in user_ratings:
-        watched_movies[r.tconst] = r.rating
-
-    # 收藏作为高权重 (10分)
+    watched_movies = {r.tconst: r.rating for r in user_ratings}
     for tconst in user_favs:
         watched_movies[tconst] = 10.0
+    return watched_movies
 
-    # 3. 开始计算推荐分数
-    candidate_scores = {}  # {movie_id: total_score}
-
-    for watched_tconst, weight in watched_movies.items():
-        # 如果这部电影不在我们的相似度矩阵里（可能是新入库的），跳过
-        if watched_tconst not in _similarity_df.index:
-            continue
-
-        # 获取与这部电影最相似的其他电影
-        # similar_series 是一个 Series: index=other_tconst, value=similarity
-        similar_series = _similarity_df[watched_tconst]
-
-        # 过滤掉相似度太低的 (比如 < 0.1)，减少噪音
-        similar_movies = similar_series[similar_series > 0.1]
 
-        for similar_tconst, similarity in similar_movies.items():
-            # 排除掉用户已经看过的
-            if similar_tconst in watched_movies:
-                continue
-
-            # 核心公式：推荐分 += 相似度 * 用户对原电影的喜爱度
-            score = similarity * weight
-            candidate_scores[similar_tconst] = candidate_scores.get(similar_tconst, 0) + score
+async def _item_cf_candidates(model, user_id, n):
+    """
+    Item-CF 候选 [(tconst, 分数)]，按分数降序
+    纯新用户 (没评分也没收藏) 按画像取同类人群喜欢的电影，分数按名次递减
+    """
+    watched_movies = await _load_watched_movies(user_id)
+    if not watched_movies:
+        tconsts = await _segment_tconsts(user_id)
+        return [(t, float(len(tconsts) - i)) for i, t in enumerate(tconsts[:n])]
 
-    # 4. 排序并取 Top N
-    if not candidate_scores:
+    # 模型没加载，返回空 (前台会降级到热门推荐)
+    if model is None:
         return []
 
-    # 按分数倒序排列
-    sorted_candidates = sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)[:100]
-    top_ids = [x[0] for x in sorted_candidates]
+    # 一次稀疏矩阵乘法 + 已看屏蔽 + argpartition 取 Top-N
+    seed_idx = model.index_of(list(watched_movies.keys()))
+    candidate_idx, scores = model.recommend(seed_idx, list(watched_movies.values()), n=n)
+    return [(str(t), float(s)) for t, s in zip(model.item_ids[candidate_idx], scores)]
 
-    # 5. 查数据库获取电影详情返回
-    async with AsyncSessionLocal() as db:
-        query = select(MovieSummary).where(MovieSummary.tconst.in_(top_ids))
-        if category != 'all':
-            query = _apply_category_filter(query, category)
 
-        res = await db.execute(query)
-        movies = res.scalars().all()
+async def get_item_cf_candidates(user_id: int, n=100):
+    """Item-CF 候选 [(tconst, 分数)]，不取电影详情、不按分类过滤 (blend_service 统一处理)"""
+    model = _model
+    version = model.version if model is not None else None
+    cache_key, cached = recommendation_cache.get('item_cf_candidates', user_id, 'all', n, version)
+    if cached is not None:
+        return cached
 
-        # 按推荐顺序重新排列 (SQL IN 查询不保证顺序)
-        movies_map = {m.tconst: m for m in movies}
-        ordered_movies = []
-        for mid in top_ids:
-            if mid in movies_map:
-                ordered_movies.append(movies_map[mid])
-                if len(ordered_movies) >= limit:
-                    break
+    result = await _item_cf_candidates(model, user_id, n)
+    recommendation_cache.put(cache_key, result)
+    return result
 
-        return ordered_movies
 
-
-async def get_spark_recommendations(user_id: int, limit=8, category='all'):
+async def _segment_tconsts(user_id):
+    """冷启动：用户画像 -> 分段推荐的 tconst 元组 (没有画像或分段数据时为空)"""
     async with AsyncSessionLocal() as db:
-        # 1. 查推荐表 (扩大范围取 100 个，防止过滤后不够)
-        stmt = (
-            select(SparkRecommendation.tconst)
-            .where(SparkRecommendation.user_id == user_id)
-            .order_by(desc(SparkRecommendation.score))
-            .limit(100)
-        )
-        res = await db.execute(stmt)
-        tconsts = res.scalars().all()
-
-        if not tconsts:
-            return []
-
-        # 2. 查详情并过滤
-        query = select(MovieSummary).where(MovieSummary.tconst.in_(tconsts))
+        profile = (await db.execute(
+            select(User.gender, User.age, User.occupation).where(User.id == user_id)
+        )).first()
+    if profile is None:
+        return ()
 
-        # 【应用过滤】
-        if category != 'all':
-            query = _apply_category_filter(query, category)
+    _, tconsts = segment_service.get_segment_tconsts(*profile)
+    return tconsts
 
-        movies_res = await db.execute(query)
-        movies = movies_res.scalars().all()
 
-        # 3. 按推荐分排序并截取
-        movies_map = {m.tconst: m for m in movies}
-        final_list = []
-        for tid in tconsts:
-            if tid in movies_map:
-                final_list.append(movies_map[tid])
-                if len(final_list) >= limit:
-                    break
-
-        return final_list
\ No newline at end of file
+async def get_als_candidates(user_id: int, n=100, category='all'):
+    """
+    ALS 候选 [(tconst, 分数)]，不取电影详情 (blend_service 统一处理)
+    有因子时在内存中打分 (限定分类时只算该分类的子矩阵)，否则读 spark_recommendations 表
+    """
+    als = _als_model
+    version = als.version if als is not None else None
+    cache_key, cached = recommendation_cache.get('als_candidates', user_id, category, n, version)
+    if cached is not None:
+        return cached
+
+    if als is not None and als.user_index(user_id) >= 0:
+        item_idx, scores = als.recommend(user_id, n=n, category_bit=movie_service.CATEGORY_BITS.get(category))
+        result = [(str(t), float(s)) for t, s in zip(als.item_ids[item_idx], scores)]
+    else:
+        async with AsyncSessionLocal() as db:
+            stmt = (
+                select(SparkRecommendation.tconst, SparkRecommendation.score)
+                .where(SparkRecommendation.user_id == user_id)
+                .order_by(desc(SparkRecommendation.score))
+                .limit(n)
+            )
+            result = [(t, float(s or 0.0)) for t, s in (await db.execute(stmt)).all()]
+    recommendation_cache.put(cache_key, result)
+    return result
@@ -0,0 +1,87 @@
+# services/search_service.py
+"""
+通用搜索条件 (标题 / 姓名 / 编号)
+
+原来各处都是 column.ilike('%q%')，前导通配符让普通 B-Tree 索引完全用不上。
+现在统一走这里：
+- 匹配语义与原来一致：标题/姓名 或 编号 (tt1234567 / nm0000001) 包含关键词 (子串，不区分大小写)，
+  所以 "0111161" 能找到 tt0111161，标题里带 "tt12" 的作品也能搜到
+- 标题/姓名的 ILIKE '%q%' 由 pg_trgm 的 GIN 索引支撑，并可按 similarity() 排序相关度
+- 少于 3 个字符的短词：trigram 索引帮不上忙，仍是子串匹配，但不排序相关度，
+  由调用方的 LIMIT / 封顶计数限定扫描量 (首页按热度索引顺序扫描，凑够一页即停)
+- similarity() 来自 pg_trgm 扩展：启动时 detect_trgm() 检测一次，没装扩展 (还没运行 add_index.py) 时
+  不排序相关度，搜索照常可用
+对应索引见 init/add_index.py
+"""
+import re
+
+from sqlalchemy import func, or_, text
+
+from database import AsyncSessionLocal
+
+# IMDb 编号：tt 开头是作品，nm 开头是人物
+ID_PATTERN = re.compile(r'^(tt|nm)\d+$')
+
+# pg_trgm 按 3 个字符切分，更短的关键词无法使用 trigram 索引
+MIN_TRGM_LENGTH = 3
+
+# 数据库是否装了 pg_trgm (similarity() 可用)，由 detect_trgm() 在启动时检测
+_trgm_available = False
+
+
+async def detect_trgm():
+    """检测 pg_trgm 扩展；没装时相关度排序自动关闭，避免查询报 "function similarity does not exist" """
+    global _trgm_available
+    try:
+        async with AsyncSessionLocal() as db:
+            found = (await db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))).scalar()
+    except Exception as e:
+        print(f"⚠️ pg_trgm 检测失败，搜索不排序相关度: {e}")
+        found = False
+    _trgm_available = bool(found)
+    if not _trgm_available:
+        print("⚠️ 未安装 pg_trgm 扩展，搜索结果不按相关度排序 (运行 python init/add_index.py 安装)")
+
+
+def normalize(search_query):
+    """去掉首尾和重复空白"""
+    return ' '.join(search_query.split()) if search_query else ''
+
+
+def is_id_query(search_query):
+    return bool(ID_PATTERN.match(normalize(search_query).lower()))
+
+
+def _escape_like(value):
+    """转义 LIKE 通配符，用户输入的 % 和 _ 按字面匹配"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def text_match(column, search_query):
+    """标题/姓名/编号匹配 (子串，不区分大小写)"""
+    return column.ilike(f"%{_escape_like(normalize(search_query))}%")
+
+
+def search_filter(search_query, text_column=None, id_columns=()):
+    """
+    生成搜索条件：文本列或任一编号列包含关键词 (与原来各处 OR 在一起的写法一致)
+    文本列走 trigram 索引，编号列的子串匹配和原来一样没有索引
+    """
+    columns = ([text_column] if text_column is not None else []) + list(id_columns)
+    return or_(*(text_match(c, search_query) for c in columns))
+
+
+def rank(text_column, search_query):
+    """相关度 (trigram 相似度，0~1)；编号查询、短词或没装 pg_trgm 时不排序，返回 None"""
+    q = normalize(search_query)
+    if not _trgm_available or not q or is_id_query(q) or len(q) < MIN_TRGM_LENGTH:
+        return None
+    return func.similarity(text_column, q)
+
+
+def order_by_rank(query, search_query, text_column, *fallback_order):
+    """有相关度时按相关度降序，其余按 fallback_order"""
+    score = rank(text_column, search_query)
+    if score is not None:
+        return query.order_by(score.desc(), *fallback_order)
+    return query.order_by(*fallback_order)
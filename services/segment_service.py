@@ -0,0 +1,156 @@
+# services/segment_service.py
+"""
+人群分段推荐 (冷启动)
+
+注册时填写的画像 (性别 / 年龄 / 职业) 此前没有任何代码使用。
+这里离线按 (性别, 年龄段, 职业) 分段统计同类用户喜欢的电影，每段保留 TOP_N 部，
+写入 segment_recommendations 表，并整体加载到内存 (segment -> tconst 元组)。
+有画像但还没有评分/收藏的新用户，由 recommendation_service.get_item_cf_candidates 直接从这里取推荐。
+
+分段越细数据越稀疏，所以同时生成几层较粗的分段，查询时逐层回退：
+    (性别, 年龄段, 职业) -> (性别, 年龄段) -> (年龄段) -> (性别)
+"""
+from sqlalchemy import select, delete, text
+
+from database import AsyncSessionLocal
+from models import SegmentRecommendation
+
+# 年龄段 (含两端)
+AGE_BANDS = [
+    (0, 17, '<18'),
+    (18, 24, '18-24'),
+    (25, 34, '25-34'),
+    (35, 44, '35-44'),
+    (45, 54, '45-54'),
+    (55, 200, '55+'),
+]
+
+# "不限" 维度的占位符
+ANY = '*'
+
+# 每个分段保留的电影数
+TOP_N = 50
+
+# 一部电影至少被该分段中这么多用户喜欢才入榜 (过滤个人偏好造成的噪声)
+MIN_USERS = 2
+
+# 评分达到这个值才算 "喜欢" (收藏一律算喜欢)
+MIN_RATING = 6.0
+
+_segments = {}  # segment -> (tconst, ...)，按分数降序
+
+
+def age_band(age):
+    if age is None:
+        return None
+    for low, high, label in AGE_BANDS:
+        if low <= age <= high:
+            return label
+    return None
+
+
+def _age_band_sql(column):
+    """与 age_band() 一致的 SQL CASE 表达式"""
+    whens = " ".join(f"WHEN {column} BETWEEN {low} AND {high} THEN '{label}'" for low, high, label in AGE_BANDS)
+    return f"CASE {whens} END"
+
+
+def segment_keys(gender, age, occupation):
+    """从细到粗的回退顺序；缺失的画像字段所在层级直接跳过"""
+    band = age_band(age)
+    levels = [
+        (gender, band, occupation),
+        (gender, band, ANY),
+        (ANY, band, ANY),
+        (gender, ANY, ANY),
+    ]
+    return ['|'.join(level) for level in levels if all(level)]
+
+
+def _rebuild_sql():
+    def part(column):
+        return f"CASE WHEN GROUPING({column}) = 1 THEN '{ANY}' ELSE {column} END"
+
+    return text(f"""
+        WITH interactions AS (
+            -- 每个 (用户, 电影) 一条：收藏记 1.0，评分记 分数/10，两者都有取较大值
+            SELECT user_id, tconst, MAX(weight) AS weight
+            FROM (
+                SELECT user_id, tconst, rating / 10.0 AS weight
+                FROM user_personal_ratings WHERE rating >= :min_rating
+                UNION ALL
+                SELECT user_id, tconst, 1.0 FROM user_favorites
+            ) liked
+            GROUP BY user_id, tconst
+        ), profiled AS (
+            SELECT i.tconst, i.weight, u.gender, {_age_band_sql('u.age')} AS band, u.occupation
+            FROM interactions i JOIN users u ON u.id = i.user_id
+        ), scored AS (
+            -- 画像字段为空的用户在对应层级得到 NULL 分段，下面过滤掉
+            SELECT {part('gender')} || '|' || {part('band')} || '|' || {part('occupation')} AS segment,
+                   tconst, SUM(weight) AS score, COUNT(*) AS users
+            FROM profiled
+            GROUP BY GROUPING SETS (
+                (gender, band, occupation, tconst),
+                (gender, band, tconst),
+                (band, tconst),
+                (gender, tconst)
+            )
+        ), ranked AS (
+            SELECT segment, tconst, score,
+                   ROW_NUMBER() OVER (PARTITION BY segment ORDER BY score DESC, tconst) AS rank
+            FROM scored
+            WHERE segment IS NOT NULL AND users >= :min_users
+        )
+        INSERT INTO segment_recommendations (segment, rank, tconst, score)
+        SELECT segment, rank, tconst, score FROM ranked WHERE rank <= :top_n
+    """)
+
+
+async def rebuild_segments():
+    """离线任务：重新生成所有分段的推荐并加载到内存"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(delete(SegmentRecommendation))
+            result = await db.execute(
+                _rebuild_sql(), {'min_rating': MIN_RATING, 'min_users': MIN_USERS, 'top_n': TOP_N}
+            )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            return False, f"分段推荐生成失败: {e}"
+
+    count = await load_segments()
+    return True, f"分段推荐生成完成：{count} 个分段，{result.rowcount} 条推荐。"
+
+
+async def load_segments():
+    """从表中加载到内存 (启动时和重建后调用)，返回分段数"""
+    try:
+        async with AsyncSessionLocal() as db:
+            stmt = select(SegmentRecommendation.segment, SegmentRecommendation.tconst) \
+                .order_by(SegmentRecommendation.segment, SegmentRecommendation.rank)
+            rows = (await db.execute(stmt)).all()
+    except Exception as e:
+        print(f"⚠️ 分段推荐加载失败: {e}")
+        return 0
+
+    segments = {}
+    for segment, tconst in rows:
+        segments.setdefault(segment, []).append(tconst)
+
+    _segments.clear()
+    _segments.update((segment, tuple(tconsts)) for segment, tconsts in segments.items())
+    return len(_segments)
+
+
+def get_segment_tconsts(gender, age, occupation):
+    """
+    按画像取分段推荐 (纯内存，逐层回退)
+    :return: (命中的分段, tconst 元组)；都没有时返回 (None, ())
+    """
+    for key in segment_keys(gender, age, occupation):
+        tconsts = _segments.get(key)
+        if tconsts:
+            return key, tconsts
+    return None, ()
@@ -0,0 +1,628 @@
+# services/similarity_model.py
+"""
+Item-Based 协同过滤的稀疏相似度模型
+
+- 输入：用户互动三元组 (user_id, tconst, 分值)，构造成 tconst × user 的 CSR 稀疏矩阵
+- 计算：分块做 X·Xᵀ 余弦相似度，每部电影只保留 Top-K 个邻居 (float32)
+- 存储：CSR 三个数组 + 电影编号词表 (model_store 版本化目录，加载时 mmap)，
+  体积与互动数量成正比，而不是电影数的平方
+- 增量状态：互动矩阵 + 每部电影的范数平方 + 每部电影前 CANDIDATE_K 个候选邻居 (比 Top-K 多留一截缓冲)，
+  不保存电影 × 电影的共现点积 (它的非零数随热门电影平方增长)
+- 增量更新：只有互动变化的电影整行重算；其它电影只修补它与这些电影之间的相似度，
+  再从候选缓冲里重新选 Top-K，缓冲不够用 (无法保证结果精确) 的行才整行重算
+"""
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+
+from services import model_store
+
+# 模型在 data/models/ 下的目录名
+MODEL_NAME = "item_cf"
+
+# 每部电影保留的邻居数量
+TOP_K = 50
+
+# 相似度低于该值的邻居视为噪音，训练时直接丢弃
+MIN_SIMILARITY = 0.1
+
+# 增量状态里每部电影保留的候选邻居数 (>= TOP_K，多出的部分是修补时的缓冲)
+CANDIDATE_K = 2 * TOP_K
+
+# 分块计算时每块的行数 (控制峰值内存)
+BLOCK_SIZE = 2048
+
+
+def _to_csr(rows, cols, values, shape, dtype=np.float32):
+    """
+    三元组 -> CSR，同一 (row, col) 出现多次时取最大值 (如既收藏又评分，取最高分)
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = np.asarray(values, dtype=dtype)
+
+    keys = rows * max(shape[1], 1) + cols
+    order = np.argsort(keys, kind='stable')
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    max_values = np.maximum.reduceat(values[order], starts) if len(starts) else values[:0]
+
+    return sp.csr_matrix(
+        (max_values, (unique_keys // max(shape[1], 1), unique_keys % max(shape[1], 1))),
+        shape=shape,
+        dtype=dtype
+    )
+
+
+def build_interaction_matrix(user_ids, tconsts, values):
+    """
+    把互动三元组构造成 Item-User 稀疏矩阵
+    同一 (tconst, user) 出现多次时 (如既收藏又评分)，取最高分
+    :return: (CSR 矩阵 [电影 × 用户], 按字典序排好的 tconst 数组, 排好序的 user_id 数组)
+    """
+    item_ids, item_idx = np.unique(np.asarray(tconsts), return_inverse=True)
+    users, user_idx = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    matrix = _to_csr(item_idx, user_idx, values, (len(item_ids), len(users)))
+    return matrix, item_ids, users
+
+
+def _assemble(row_counts, cols, vals, shape, dtype=np.float32):
+    """按行拼装 CSR；indptr 与 indices 使用同一种整型，scipy 组装时不会再复制 (mmap 零拷贝的前提)"""
+    indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+    np.cumsum(row_counts, out=indptr[1:])
+    index_dtype = np.int32 if indptr[-1] < np.iinfo(np.int32).max and shape[1] < np.iinfo(np.int32).max \
+        else np.int64
+    return sp.csr_matrix(
+        (np.asarray(vals, dtype=dtype), np.asarray(cols, dtype=index_dtype), indptr.astype(index_dtype)),
+        shape=shape
+    )
+
+
+def _unify_index_dtype(matrix):
+    """把任意 CSR 的 indptr/indices 统一成同一整型 (落盘后可零拷贝加载)"""
+    matrix = matrix.tocsr()
+    counts = np.diff(matrix.indptr)
+    return _assemble(counts, matrix.indices, matrix.data, matrix.shape, matrix.dtype)
+
+
+def _rank_key(rows, vals):
+    """
+    (行号升序, 相似度降序) 的整型排序键
+    相似度都是正的 float32，其位模式与数值同序，和行号拼成一个 uint64，比按浮点数多键排序快得多
+    """
+    desc = np.uint64(0xFFFFFFFF) - np.asarray(vals, dtype=np.float32).view(np.uint32).astype(np.uint64)
+    return (np.asarray(rows).astype(np.uint64) << np.uint64(32)) | desc
+
+
+def _sort_ranked(rows, cols, vals):
+    """按行、相似度降序 (相同时按列号升序) 排列条目"""
+    rows = np.asarray(rows, dtype=np.int64)
+    vals = np.asarray(vals, dtype=np.float32)
+    order = np.lexsort((cols, _rank_key(rows, vals)))
+    return rows[order], np.asarray(cols)[order], vals[order]
+
+
+def _rank_in_rows(rows, cols, vals, n_rows, k):
+    """
+    每行按相似度降序 (相同时按列号升序) 排列后只保留前 k 个 (全向量化，无逐行循环)
+    :return: (每行保留个数, 列号, 相似度, 每行被截掉的最大相似度 (没有截掉的行为 -inf))
+    """
+    return _truncate_ranked(*_sort_ranked(rows, cols, vals), n_rows, k)
+
+
+def _truncate_ranked(rows, cols, vals, n_rows, k):
+    """条目已按 _sort_ranked 的顺序排好，每行只保留前 k 个，返回值同 _rank_in_rows"""
+    counts = np.bincount(rows, minlength=n_rows)
+    row_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(len(rows)) - row_starts[rows]
+    keep = rank < k
+
+    dropped = np.full(n_rows, -np.inf, dtype=np.float32)
+    first_dropped = rank == k
+    dropped[rows[first_dropped]] = vals[first_dropped]
+    return np.minimum(counts, k), cols[keep], vals[keep], dropped
+
+
+def _merge_ranked(ranked, extra):
+    """
+    把少量新条目 extra 归并进已排好序的条目 ranked (两者的 (行, 列) 互不重复)
+    只对新条目排序，旧条目靠二分查找定位，避免对全部条目重新排序
+    :return: 归并后的 (行号, 列号, 相似度)，顺序同 _sort_ranked
+    """
+    rows, cols, vals = ranked
+    new_rows, new_cols, new_vals = _sort_ranked(*extra)
+    if not len(rows):
+        return new_rows, new_cols, new_vals
+
+    # 先按 (行, 相似度) 定位；与旧条目完全同分时，再按列号在同分的一段里定位
+    keys = _rank_key(rows, vals)
+    new_keys = _rank_key(new_rows, new_vals)
+    pos = np.searchsorted(keys, new_keys, side="left")
+    tie = np.searchsorted(keys, new_keys, side="right") > pos
+    if tie.any():
+        group = np.concatenate(([0], np.cumsum(keys[1:] != keys[:-1]))).astype(np.uint64)
+        grouped = (group << np.uint64(32)) | cols.astype(np.uint64)
+        pos[tie] = np.searchsorted(grouped, (group[pos[tie]] << np.uint64(32)) | new_cols[tie].astype(np.uint64))
+
+    total = len(rows) + len(new_rows)
+    new_at = pos + np.arange(len(new_rows))
+    old_at = np.ones(total, dtype=bool)
+    old_at[new_at] = False
+    merged = []
+    for old, new in ((rows, new_rows), (cols, new_cols), (vals, new_vals)):
+        out = np.empty(total, dtype=np.result_type(old, new))
+        out[old_at] = old
+        out[new_at] = new
+        merged.append(out)
+    return tuple(merged)
+
+
+def _cosine_entries(dots, row_ids, sq_norms, min_similarity):
+    """
+    由若干行点积 (b × n) 计算余弦相似度 cos(i, j) = dot(i, j) / (‖i‖ · ‖j‖)，去掉自身和低相似度的噪音
+    :param row_ids: 这几行在全局的行号
+    :return: (块内行号, 列号, 相似度 float32)
+    """
+    coo = dots.tocoo()
+    rows, cols, values = coo.row.astype(np.int64), coo.col.astype(np.int64), coo.data
+    denom = np.sqrt(sq_norms[row_ids[rows]] * sq_norms[cols])
+    vals = np.divide(values, denom, out=np.zeros(len(values), dtype=np.float64), where=denom > 0)
+    keep = (vals > min_similarity) & (cols != row_ids[rows])
+    return rows[keep], cols[keep], vals[keep].astype(np.float32)
+
+
+def _squared_norms(item_user):
+    """每部电影 (行) 的范数平方"""
+    matrix = item_user.astype(np.float64)
+    return np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+
+
+def _dot_blocks(item_user, row_ids, block_size=BLOCK_SIZE):
+    """分块现算点积行 X[rows]·Xᵀ (算完即丢，不保留 gram)，逐块产出 (这块的全局行号, 点积 CSR)"""
+    matrix = item_user.tocsr().astype(np.float64)
+    transposed = matrix.T.tocsr()
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    for start in range(0, len(row_ids), block_size):
+        ids = row_ids[start:start + block_size]
+        yield ids, (matrix[ids] @ transposed).tocsr()
+
+
+def _floor(dropped, min_similarity):
+    """候选行的下界：缓冲之外的邻居相似度都不超过它；没有截掉任何邻居时就是阈值本身"""
+    return np.maximum(dropped, np.float32(min_similarity))
+
+
+def _neighbor_rows(item_user, row_ids, sq_norms, keep_k, min_similarity, block_size=BLOCK_SIZE):
+    """
+    为 row_ids 这些电影整行计算邻居，每行保留前 keep_k 个
+    :return: (CSR [len(row_ids) × 电影数] float32, 每行的下界 float32)
+    """
+    n_items = item_user.shape[0]
+    blocks, floors = [], []
+    for ids, dots in _dot_blocks(item_user, row_ids, block_size):
+        rows, cols, vals = _cosine_entries(dots, ids, sq_norms, min_similarity)
+        counts, cols, vals, dropped = _rank_in_rows(rows, cols, vals, len(ids), keep_k)
+        blocks.append(_assemble(counts, cols, vals, (len(ids), n_items)))
+        floors.append(_floor(dropped, min_similarity))
+
+    if not blocks:
+        return _unify_index_dtype(sp.csr_matrix((0, n_items), dtype=np.float32)), np.zeros(0, dtype=np.float32)
+    return _unify_index_dtype(sp.vstack(blocks).astype(np.float32)), np.concatenate(floors)
+
+
+def _head(matrix, k):
+    """每行只留前 k 个 (候选缓冲 -> 对外服务的 Top-K 邻居矩阵)；候选行内已按相似度降序排列，直接截取"""
+    counts = np.diff(matrix.indptr)
+    rank = np.arange(matrix.nnz) - np.repeat(matrix.indptr[:-1], counts)
+    keep = rank < k
+    return _assemble(np.minimum(counts, k), matrix.indices[keep], matrix.data[keep], matrix.shape)
+
+
+def compute_similarity(item_user, top_k=TOP_K, min_similarity=MIN_SIMILARITY, block_size=BLOCK_SIZE,
+                       candidate_k=CANDIDATE_K):
+    """
+    稀疏余弦相似度：分块计算 X·Xᵀ，每行保留前 candidate_k 个候选，对外只用前 Top-K 个
+    :param item_user: CSR 矩阵 [电影 × 用户]
+    :return: (相似度 CSR [电影 × 电影] float32, 候选缓冲 CSR, 候选下界, 每部电影的范数平方)，后三项供增量更新使用
+    """
+    sq_norms = _squared_norms(item_user)
+    row_ids = np.arange(item_user.shape[0])
+    candidates, floors = _neighbor_rows(
+        item_user, row_ids, sq_norms, max(candidate_k, top_k), min_similarity, block_size
+    )
+    return _unify_index_dtype(_head(candidates, top_k)), candidates, floors, sq_norms
+
+
+def _remap(matrix, shape, row_map, col_map):
+    """词表扩充后，把旧行号/列号映射到新位置 (映射单调，行内顺序保持不变)"""
+    counts = np.zeros(shape[0], dtype=np.int64)
+    counts[row_map] = np.diff(matrix.indptr)
+    return _assemble(counts, col_map[matrix.indices], matrix.data, shape, matrix.dtype)
+
+
+def _splice_rows(matrix, row_idx, new_rows):
+    """
+    用 new_rows (len(row_idx) × n) 整行替换 matrix 中的 row_idx 行 (row_idx 升序)
+    与 _replace_rows 不同，每行内部的顺序保持不变 (候选 / 邻居矩阵行内按相似度降序排列)
+    """
+    n_rows = matrix.shape[0]
+    counts = np.diff(matrix.indptr).astype(np.int64)
+    entry_rows = np.repeat(np.arange(n_rows), counts)
+    replaced = np.zeros(n_rows, dtype=bool)
+    replaced[row_idx] = True
+    keep = ~replaced[entry_rows]
+
+    new_counts = np.diff(new_rows.indptr)
+    counts[row_idx] = new_counts
+    rows = np.concatenate((entry_rows[keep], np.repeat(np.asarray(row_idx, dtype=np.int64), new_counts)))
+    order = np.argsort(rows, kind="stable")
+    cols = np.concatenate((matrix.indices[keep], new_rows.indices))[order]
+    vals = np.concatenate((matrix.data[keep], new_rows.data))[order]
+    return _assemble(counts, cols, vals, matrix.shape, matrix.dtype)
+
+
+def _replace_rows(matrix, row_idx, new_rows):
+    """用 new_rows (len(row_idx) × n) 整行替换 matrix 中的 row_idx 行"""
+    n_rows = matrix.shape[0]
+    keep = np.ones(n_rows, dtype=matrix.dtype)
+    keep[row_idx] = 0
+    kept = sp.diags(keep) @ matrix
+    scatter = sp.csr_matrix(
+        (np.ones(len(row_idx), dtype=matrix.dtype), (row_idx, np.arange(len(row_idx)))),
+        shape=(n_rows, len(row_idx))
+    )
+    result = (kept + scatter @ new_rows).tocsr()
+    result.eliminate_zeros()
+    return result
+
+
+class SimilarityModel:
+    """
+    训练好的相似度模型 (只读)
+    - item_ids: 按字典序排列的 tconst 数组，下标即矩阵行号
+    - similarity: CSR 邻居矩阵 [电影 × 电影]
+    增量更新所需的状态 (可选)：
+    - user_ids: 排好序的 user_id 数组，下标即 interactions 的行号
+    - interactions: CSR [用户 × 电影]，当前生效的互动分值
+    - sq_norms: 每部电影的范数平方 (余弦相似度的分母)
+    - candidates: CSR [电影 × 电影]，每行前 CANDIDATE_K 个候选邻居 (similarity 是它每行的前 TOP_K 个)
+    - floors: 每行候选的下界，缓冲之外的邻居相似度都不超过它 (等于 MIN_SIMILARITY 表示这一行没有截断)
+    """
+
+    def __init__(self, item_ids, similarity, built_at=None, user_ids=None, interactions=None, sq_norms=None,
+                 candidates=None, floors=None, meta=None):
+        self.item_ids = item_ids
+        self.similarity = similarity
+        self.built_at = built_at or datetime.now()
+        self.user_ids = user_ids
+        self.interactions = interactions
+        self.sq_norms = sq_norms
+        self.candidates = candidates
+        self.floors = floors
+        self.meta = dict(meta or {})
+        self.version = self.meta.get("version")
+
+    @property
+    def item_count(self):
+        return len(self.item_ids)
+
+    @property
+    def has_state(self):
+        return self.interactions is not None and self.candidates is not None
+
+    @property
+    def event_seq(self):
+        """训练数据截止的互动事件序号 (增量更新从这里继续)"""
+        return self.meta.get("event_seq")
+
+    def index_of(self, tconsts):
+        """
+        tconst -> 行号 (词表有序，二分查找)；不在模型里的返回 -1
+        按完整字符串比较：不能转成词表的定长类型，否则比词表更长的编号会被截断后误匹配
+        """
+        tconsts = np.asarray(tconsts).astype(str)
+        if self.item_count == 0:
+            return np.full(len(tconsts), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.item_ids, tconsts), self.item_count - 1)
+        return np.where(self.item_ids[pos] == tconsts, pos, -1)
+
+    def neighbors(self, idx):
+        """返回第 idx 部电影的 (邻居行号数组, 相似度数组)"""
+        start, end = self.similarity.indptr[idx], self.similarity.indptr[idx + 1]
+        return self.similarity.indices[start:end], self.similarity.data[start:end]
+
+    def recommend(self, seed_idx, weights, n=100):
+        """
+        批量打分：一次稀疏 向量×矩阵 乘法代替逐部电影的 Python 循环
+        score = Σ 种子权重 × 种子与候选的相似度，并屏蔽种子本身 (用户已看过)
+        :param seed_idx: 种子电影行号 (-1 表示不在模型中，会被忽略)
+        :param weights: 种子权重 (评分 / 收藏=10)
+        :return: (候选行号数组, 分数数组)，按分数降序，最多 n 个
+        """
+        seed_idx = np.asarray(seed_idx, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        valid = seed_idx >= 0
+        seed_idx, weights = seed_idx[valid], weights[valid]
+        if len(seed_idx) == 0 or n <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # 1 × N 的稀疏权重向量，乘积结果只包含被触达的候选列
+        seed_vector = sp.csr_matrix(
+            (weights, (np.zeros(len(seed_idx), dtype=np.int64), seed_idx)),
+            shape=(1, self.item_count)
+        )
+        scores = (seed_vector @ self.similarity).tocsr()
+        candidates, values = scores.indices, scores.data
+
+        # 屏蔽已看过的
+        unseen = ~np.isin(candidates, seed_idx)
+        candidates, values = candidates[unseen], values[unseen]
+
+        # argpartition 取 Top-N，再对这 N 个排序
+        if len(values) > n:
+            top = np.argpartition(-values, n - 1)[:n]
+            candidates, values = candidates[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        return candidates[order].astype(np.int64), values[order]
+
+    def to_arrays(self):
+        """导出为原生数组 (CSR 三件套 + 词表，以及增量状态)，供 model_store 落盘"""
+        arrays = {
+            "item_ids": self.item_ids,
+            "indptr": self.similarity.indptr,
+            "indices": self.similarity.indices,
+            "data": self.similarity.data,
+        }
+        if self.has_state:
+            arrays.update({
+                "user_ids": self.user_ids,
+                "r_indptr": self.interactions.indptr,
+                "r_indices": self.interactions.indices,
+                "r_data": self.interactions.data,
+                "sq_norms": self.sq_norms,
+                "c_indptr": self.candidates.indptr,
+                "c_indices": self.candidates.indices,
+                "c_data": self.candidates.data,
+                "c_floors": self.floors,
+            })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, built_at=None, meta=None):
+        """由 (可能是 mmap 的) 数组直接组装，不复制数据"""
+        item_ids = arrays["item_ids"]
+        n_items = len(item_ids)
+        similarity = sp.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(n_items, n_items),
+            copy=False
+        )
+
+        # 旧版本的模型目录没有候选缓冲，视为不含增量状态 (下一次更新走全量训练)
+        user_ids = interactions = sq_norms = candidates = floors = None
+        if "c_data" in arrays:
+            user_ids = arrays["user_ids"]
+            interactions = sp.csr_matrix(
+                (arrays["r_data"], arrays["r_indices"], arrays["r_indptr"]),
+                shape=(len(user_ids), n_items),
+                copy=False
+            )
+            sq_norms = arrays["sq_norms"]
+            candidates = sp.csr_matrix(
+                (arrays["c_data"], arrays["c_indices"], arrays["c_indptr"]),
+                shape=(n_items, n_items),
+                copy=False
+            )
+            floors = arrays["c_floors"]
+        return cls(item_ids, similarity, built_at, user_ids, interactions, sq_norms, candidates, floors, meta)
+
+    def save(self, version_meta=None):
+        """写入一个新的模型版本，返回版本号"""
+        meta = {k: v for k, v in self.meta.items() if k not in ("version", "format", "arrays", "created_at")}
+        meta.update({
+            "built_at": self.built_at.isoformat(),
+            "item_count": self.item_count,
+            "nnz": int(self.similarity.nnz),
+        })
+        meta.update(version_meta or {})
+        return model_store.write_artifact(MODEL_NAME, self.to_arrays(), meta)
+
+    @classmethod
+    def load(cls, version=None):
+        """mmap 方式加载 (默认 CURRENT 版本)；没有模型时返回 None"""
+        arrays, meta = model_store.read_artifact(MODEL_NAME, version)
+        if arrays is None:
+            return None
+        return cls.from_arrays(arrays, datetime.fromisoformat(meta["built_at"]), meta)
+
+    def apply_updates(self, user_ids, tconsts, values, affected_users=None, top_k=TOP_K,
+                      min_similarity=MIN_SIMILARITY):
+        """
+        增量更新：传入受影响用户的 **完整** 当前互动 (三元组)，返回新的模型
+        1. 词表扩充 (新电影 / 新用户)
+        2. 用新行整行替换受影响用户的旧行；互动有变化的电影 (changed) 重算范数平方
+        3. 点积只在 changed 的行和列上变化：changed 的行整行重算 (现算点积)；
+           其它行只修补与 changed 之间的相似度 (由 changed 行的结果转置得到)，再从候选缓冲里重选 Top-K。
+           修补后高于下界的候选不足 Top-K 个、无法保证与全量训练一致的行，才整行重算
+        :param affected_users: 受影响的全部 user_id。删光了互动的用户不会出现在三元组里，
+                               必须从这里传入，否则他们的旧互动不会被减掉；默认只取三元组中的用户
+        """
+        if not self.has_state:
+            raise ValueError("当前模型不含增量状态，请先全量训练")
+
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        affected_users = np.union1d(user_ids, np.asarray(
+            affected_users if affected_users is not None else [], dtype=np.int64
+        ))
+        candidate_k = max(CANDIDATE_K, top_k)
+
+        # 1. 词表扩充 (有序词表合并，旧行号单调映射到新位置)
+        # 按完整字符串合并 (新电影编号可能比旧词表的定长类型更长，不能截断)
+        tconsts = np.asarray(tconsts).astype(str)
+        item_ids = np.union1d(self.item_ids.astype(str), tconsts)
+        users = np.union1d(self.user_ids, affected_users)
+        n_items, n_users = len(item_ids), len(users)
+
+        item_map = np.searchsorted(item_ids, self.item_ids.astype(str))
+        user_map = np.searchsorted(users, self.user_ids)
+        grown = n_items != self.item_count or n_users != len(self.user_ids)
+
+        similarity = self.similarity
+        candidates = self.candidates
+        interactions = self.interactions
+        sq_norms = np.array(self.sq_norms, dtype=np.float64)
+        floors = np.array(self.floors, dtype=np.float32)
+        if grown:
+            similarity = _remap(similarity, (n_items, n_items), item_map, item_map)
+            candidates = _remap(candidates, (n_items, n_items), item_map, item_map)
+            interactions = _remap(interactions, (n_users, n_items), user_map, item_map)
+            sq_norms = np.zeros(n_items, dtype=np.float64)
+            sq_norms[item_map] = self.sq_norms
+            floors = np.full(n_items, np.float32(min_similarity), dtype=np.float32)
+            floors[item_map] = self.floors
+
+        # 2. 受影响用户的新旧互动行
+        affected = np.searchsorted(users, affected_users)
+        local_user = np.searchsorted(affected_users, user_ids)
+        new_rows = _to_csr(local_user, np.searchsorted(item_ids, tconsts), values, (len(affected), n_items))
+        old_rows = interactions[affected].astype(np.float32)
+        interactions = _replace_rows(interactions.astype(np.float32), affected, new_rows)
+        item_user = interactions.T.tocsr()
+
+        diff = (new_rows - old_rows).tocsr()
+        diff.eliminate_zeros()
+        changed = np.unique(diff.indices).astype(np.int64)
+        if len(changed):
+            sq_norms[changed] = _squared_norms(item_user[changed])
+        is_changed = np.zeros(n_items, dtype=bool)
+        is_changed[changed] = True
+
+        # 3a. changed 的行：现算点积，得到不截断的相似度 (c, j)，同时用于修补其它行的 (j, c)
+        c_rows, c_cols, c_vals = [], [], []
+        for ids, dots in _dot_blocks(item_user, changed):
+            rows, cols, vals = _cosine_entries(dots, ids, sq_norms, min_similarity)
+            c_rows.append(ids[rows])
+            c_cols.append(cols)
+            c_vals.append(vals)
+        c_rows = np.concatenate(c_rows) if c_rows else np.zeros(0, dtype=np.int64)
+        c_cols = np.concatenate(c_cols) if c_cols else np.zeros(0, dtype=np.int64)
+        c_vals = np.concatenate(c_vals) if c_vals else np.zeros(0, dtype=np.float32)
+
+        # 3b. 需要修补的行：旧候选里有指向 changed 的邻居，或者新出现了与 changed 的相似度
+        old = candidates.tocoo()
+        patch = ~is_changed[c_cols]
+        patched = np.setdiff1d(
+            np.union1d(old.row[is_changed[old.col]], c_cols[patch]), changed
+        ).astype(np.int64)
+
+        # 旧候选 (行内已按相似度降序) 去掉指向 changed 的条目，新算出来的 (j, c) 作为新条目
+        old_part = candidates[patched].tocoo()
+        keep_old = ~is_changed[old_part.col]
+        old_entries = (old_part.row[keep_old].astype(np.int64), old_part.col[keep_old].astype(np.int64),
+                       old_part.data[keep_old].astype(np.float32))
+        new_entries = (np.searchsorted(patched, c_cols[patch]), c_rows[patch], c_vals[patch])
+
+        # 不高于下界的条目排名不可靠 (缓冲之外可能有同样高甚至更高的)，丢掉；
+        # 剩下的不足 Top-K 个、且这一行本来就有截断的，只能整行重算
+        patch_floors = floors[patched]
+        old_entries, new_entries = (
+            tuple(part[entries[2] > patch_floors[entries[0]]] for part in entries)
+            for entries in (old_entries, new_entries)
+        )
+        above = np.bincount(np.concatenate((old_entries[0], new_entries[0])), minlength=len(patched))
+        complete = patch_floors <= np.float32(min_similarity)
+        exact = complete | (above >= top_k)
+        old_entries, new_entries = (
+            tuple(part[exact[entries[0]]] for part in entries) for entries in (old_entries, new_entries)
+        )
+
+        counts, p_cols, p_vals, dropped = _truncate_ranked(
+            *_merge_ranked(old_entries, new_entries), len(patched), candidate_k
+        )
+        p_rows = np.repeat(patched, counts)
+        patched_floors = np.maximum(patch_floors, dropped)
+        failed = patched[~exact]
+
+        # 3c. 整行重算：changed + 修补失败的行
+        counts, r_cols, r_vals, dropped = _rank_in_rows(
+            np.searchsorted(changed, c_rows), c_cols, c_vals, len(changed), candidate_k
+        )
+        r_rows = np.repeat(changed, counts)
+        changed_floors = _floor(dropped, min_similarity)
+        failed_rows, failed_floors = _neighbor_rows(item_user, failed, sq_norms, candidate_k, min_similarity)
+        failed_coo = failed_rows.tocoo()
+
+        # 4. 合并所有被替换的行，候选缓冲和对外的 Top-K 一起更新
+        replaced = np.concatenate((changed, patched[exact], failed))
+        order = np.argsort(replaced)
+        replaced = replaced[order]
+        floors[replaced] = np.concatenate((changed_floors, patched_floors[exact], failed_floors))[order]
+
+        # 各段内部已按 (行, 排名) 排好，稳定排序按行归并后行内仍按相似度降序
+        all_rows = np.searchsorted(replaced, np.concatenate((r_rows, p_rows, failed[failed_coo.row])))
+        order = np.argsort(all_rows, kind="stable")
+        new_candidates = _assemble(
+            np.bincount(all_rows, minlength=len(replaced)),
+            np.concatenate((r_cols, p_cols, failed_coo.col))[order],
+            np.concatenate((r_vals, p_vals, failed_coo.data))[order],
+            (len(replaced), n_items)
+        )
+        if len(replaced):
+            candidates = _splice_rows(candidates, replaced, new_candidates)
+            similarity = _splice_rows(similarity, replaced, _head(new_candidates, top_k))
+
+        meta = dict(self.meta)
+        meta.update({
+            "updated_rows": int(len(changed) + len(failed)),
+            "patched_rows": int(exact.sum()),
+            "updated_users": int(len(affected)),
+        })
+        return SimilarityModel(
+            item_ids,
+            _unify_index_dtype(similarity.astype(np.float32)),
+            datetime.now(),
+            users,
+            _unify_index_dtype(interactions),
+            sq_norms,
+            _unify_index_dtype(candidates.astype(np.float32)),
+            floors,
+            meta
+        )
+
+
+def train(user_ids, tconsts, values, top_k=TOP_K, min_similarity=MIN_SIMILARITY):
+    """一站式训练：三元组 -> SimilarityModel (含增量状态)"""
+    item_user, item_ids, users = build_interaction_matrix(user_ids, tconsts, values)
+    similarity, candidates, floors, sq_norms = compute_similarity(
+        item_user, top_k=top_k, min_similarity=min_similarity
+    )
+    return SimilarityModel(
+        item_ids, similarity,
+        user_ids=users,
+        interactions=_unify_index_dtype(item_user.T.tocsr()),
+        sq_norms=sq_norms,
+        candidates=candidates,
+        floors=floors
+    )
+
+
+def train_and_save(user_ids, tconsts, values, event_seq=None, top_k=TOP_K, min_similarity=MIN_SIMILARITY):
+    """
+    训练并写入新版本
+    设计为在子进程 (ProcessPoolExecutor) 中执行，只返回版本号，避免把大矩阵传回主进程
+    """
+    model = train(user_ids, tconsts, values, top_k=top_k, min_similarity=min_similarity)
+    return model.save({"event_seq": event_seq, "mode": "full"})
+
+
+def update_and_save(base_version, user_ids, tconsts, values, event_seq=None, affected_users=None):
+    """
+    在 base_version 的基础上做增量更新并写入新版本 (子进程中执行)
+    :param affected_users: 受影响的全部用户 (含已删光互动的用户)，见 SimilarityModel.apply_updates
+    :return: (新版本号, 整行重算的行数)
+    """
+    base = SimilarityModel.load(base_version)
+    model = base.apply_updates(user_ids, tconsts, values, affected_users=affected_users)
+    version = model.save({"event_seq": event_seq, "mode": "incremental",
+                          "base_version": base_version})
+    return version, model.meta["updated_rows"]
@@ -0,0 +1,218 @@
+# services/trending_service.py
+"""
+实时热门趋势 (进程内)
+
+movie_summary 里的 numVotes 只在导入 IMDb 数据时变化，反映不了站内"最近大家在看什么"。
+这里由 interaction_service 在每次收藏/评分成功后直接喂数据：
+- 每个分类 (全部 + 首页各分类) 一个 Space-Saving 计数器，最多跟踪 CAPACITY 部电影，内存有上界
+- 前向指数衰减：新事件的权重按 2^((t - 基准时间) / 半衰期) 放大，等价于旧事件按半衰期衰减，
+  排序时不需要逐个更新所有计数；放大倍数过大时整体归一化一次
+- 读取走每个分类的 Top 快照 (最多 SNAPSHOT_SECONDS 秒重建一次)，get_trending 只是切片，O(K)
+- 定期把计数器写入 trending_counters 表，重启时按离线时长衰减后恢复
+  多个 worker 共用这张表：按 (分类, 电影) 逐条 upsert，与已有记录衰减到同一时刻后取较大值，
+  不会清掉其它 worker 写入的计数；长期没人刷新的记录按 PRUNE_HALF_LIVES 清理
+"""
+import heapq
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func, case, cast, Float
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from models import TrendingCounter
+from services.event_log import EVENT_RATE, EVENT_FAVORITE
+from services.movie_service import CATEGORY_BITS
+
+# 热度半衰期 (秒)：6 小时前的一次收藏只算现在的一半
+HALF_LIFE_SECONDS = 6 * 3600
+
+# 每个分类最多跟踪的电影数 (Space-Saving 容量，决定内存上界和 Top-K 的精度)
+CAPACITY = 300
+
+# 快照保留的条数 (get_trending 的 limit 上限) 与重建间隔
+SNAPSHOT_SIZE = 50
+SNAPSHOT_SECONDS = 5
+
+# 各类事件的权重；取消收藏/删除评分不扣分 (Space-Saving 不支持递减，热度会随时间自然衰减)
+EVENT_WEIGHTS = {
+    EVENT_FAVORITE: 2.0,
+    EVENT_RATE: 1.0,
+}
+
+# 检查点里超过这么多个半衰期没有被任何 worker 刷新的记录 (热度已不足千分之一) 会被删除
+PRUNE_HALF_LIVES = 10
+
+# 放大指数超过这个值就整体归一化，避免浮点溢出
+_RENORMALIZE_EXPONENT = 40
+
+
+class _DecayedTopK:
+    """一个分类的 Space-Saving 计数器 (计数是以 _landmark 为基准放大后的值)"""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.counters = {}  # tconst -> [count, error]
+        self.snapshot = []  # [(tconst, count)]，按 count 降序
+        self.snapshot_at = 0.0
+        self.dirty = False
+
+    def add(self, tconst, weight):
+        entry = self.counters.get(tconst)
+        if entry is not None:
+            entry[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[tconst] = [weight, 0.0]
+        else:
+            # 计数器已满：替换当前最小的那个，新条目继承它的计数 (高估上界记在 error 里)
+            victim = min(self.counters, key=lambda t: self.counters[t][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[tconst] = [floor + weight, floor]
+        self.dirty = True
+
+    def rescale(self, factor):
+        for entry in self.counters.values():
+            entry[0] *= factor
+            entry[1] *= factor
+        self.snapshot = [(t, c * factor) for t, c in self.snapshot]
+
+    def top(self, now):
+        if self.dirty and now - self.snapshot_at >= SNAPSHOT_SECONDS:
+            self.snapshot = heapq.nlargest(
+                SNAPSHOT_SIZE, ((t, e[0]) for t, e in self.counters.items()), key=lambda x: x[1]
+            )
+            self.snapshot_at = now
+            self.dirty = False
+        return self.snapshot
+
+
+_landmark = time.time()
+_tables = {category: _DecayedTopK() for category in ['all', *CATEGORY_BITS]}
+_changed_since_checkpoint = False
+
+
+def _scale(now):
+    """当前时刻新事件的放大倍数"""
+    global _landmark
+    exponent = (now - _landmark) / HALF_LIFE_SECONDS
+    if exponent > _RENORMALIZE_EXPONENT:
+        factor = 2.0 ** -exponent
+        for table in _tables.values():
+            table.rescale(factor)
+        _landmark = now
+        exponent = 0.0
+    return 2.0 ** exponent
+
+
+def _categories_of(category_mask):
+    categories = ['all']
+    if category_mask:
+        categories.extend(c for c, bit in CATEGORY_BITS.items() if category_mask & bit)
+    return categories
+
+
+def record(tconst, event_type, category_mask=None):
+    """
+    记录一次互动 (interaction_service 写入成功后调用)
+    :param category_mask: movie_summary.category_mask，为空时只计入 "全部"
+    """
+    global _changed_since_checkpoint
+    weight = EVENT_WEIGHTS.get(event_type)
+    if not weight:
+        return
+
+    boosted = weight * _scale(time.time())
+    for category in _categories_of(category_mask):
+        _tables[category].add(tconst, boosted)
+    _changed_since_checkpoint = True
+
+
+def get_trending(category='all', limit=10):
+    """
+    当前热门 Top-N
+    :return: [(tconst, 热度)]，热度是衰减到当前时刻的加权互动数
+    """
+    table = _tables.get(category) or _tables['all']
+    now = time.time()
+    scale = _scale(now)
+    return [(tconst, count / scale) for tconst, count in table.top(now)[:limit]]
+
+
+def _upsert_statement():
+    """
+    逐条 upsert：已有记录 (可能是其它 worker 写的) 先衰减到本次写入时刻，再与本 worker 的计数取较大值
+    同一 worker 重复写入是幂等的；不同 worker 各自看到的是部分事件，取较大值是不丢数据的保守合并
+    """
+    stmt = insert(TrendingCounter)
+    elapsed = cast(func.extract('epoch', stmt.excluded.saved_at - TrendingCounter.saved_at), Float)
+    decay = func.power(0.5, func.greatest(elapsed, 0.0) / float(HALF_LIFE_SECONDS))
+    existing = TrendingCounter.count * decay
+    newer_wins = stmt.excluded.count >= existing
+    return stmt.on_conflict_do_update(
+        index_elements=['category', 'tconst'],
+        set_=dict(
+            count=func.greatest(stmt.excluded.count, existing),
+            error=case((newer_wins, stmt.excluded.error), else_=TrendingCounter.error * decay),
+            saved_at=func.greatest(stmt.excluded.saved_at, TrendingCounter.saved_at),
+        )
+    )
+
+
+async def checkpoint():
+    """把计数器写入数据库 (定时调用；没有新互动时跳过)"""
+    global _changed_since_checkpoint
+    if not _changed_since_checkpoint:
+        return
+
+    scale = _scale(time.time())
+    saved_at = datetime.now()
+    rows = [
+        {'category': category, 'tconst': tconst, 'count': count / scale, 'error': error / scale,
+         'saved_at': saved_at}
+        for category, table in _tables.items()
+        for tconst, (count, error) in table.counters.items()
+    ]
+    _changed_since_checkpoint = False
+
+    async with AsyncSessionLocal() as db:
+        try:
+            if rows:
+                await db.execute(_upsert_statement(), rows)
+            await db.execute(delete(TrendingCounter).where(
+                TrendingCounter.saved_at < saved_at - timedelta(seconds=PRUNE_HALF_LIVES * HALF_LIFE_SECONDS)
+            ))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            _changed_since_checkpoint = True
+            print(f"❌ 热门趋势检查点写入失败: {e}")
+
+
+async def restore():
+    """启动时从检查点恢复 (按离线时长衰减)"""
+    try:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(TrendingCounter))).scalars().all()
+    except Exception as e:
+        print(f"⚠️ 热门趋势检查点读取失败: {e}")
+        return
+
+    scale = _scale(time.time())
+    now = datetime.now()
+
+    def decay_of(row):
+        age = max((now - row.saved_at).total_seconds(), 0) if row.saved_at else 0
+        return 0.5 ** (age / HALF_LIFE_SECONDS) * scale
+
+    # 各条记录的写入时刻不同，按衰减到当前的热度从高到低填满计数器
+    decayed = sorted(((row, decay_of(row)) for row in rows), key=lambda x: (x[0].count or 0.0) * x[1],
+                     reverse=True)
+    for row, decay in decayed:
+        table = _tables.get(row.category)
+        if table is None or len(table.counters) >= table.capacity:
+            continue
+        table.counters[row.tconst] = [(row.count or 0.0) * decay, (row.error or 0.0) * decay]
+        table.dirty = True
+
+    if rows:
+        print(f"📈 已恢复热门趋势计数器 {len(rows)} 条")